@@ -42,11 +42,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'multiselectfield',
     'web',
 ]
 
 MIDDLEWARE = [
+    # First so their totals cover every other middleware
+    'web.metrics.MetricsMiddleware',
+    'web.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,6 +82,13 @@ WSGI_APPLICATION = 'apexmotors.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Connections are kept open for DB_CONN_MAX_AGE seconds (0 closes them after
+# every request) and checked before reuse when DB_CONN_HEALTH_CHECKS is on.
+# To go through PgBouncer in transaction pooling mode (the `pgbouncer`
+# compose profile) point POSTGRES_HOST/PORT at it and set DB_PGBOUNCER=1,
+# which turns off server-side cursors; exports then buffer each query
+# result client-side.
 
 DATABASES = {
     'default': {
@@ -85,11 +96,85 @@ DATABASES = {
         'NAME': os.environ.get('POSTGRES_DB'),
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
-        'HOST': 'db',
-        'PORT': '5432',
+        'HOST': os.environ.get('POSTGRES_HOST', 'db'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER', '0') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+}
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# CACHE_BACKEND picks the store: 'locmem' (per process, development only
+# since invalidations do not reach other gunicorn workers), 'file' (shared by
+# every process that mounts CACHE_LOCATION), 'redis' or 'memcached' (need the
+# redis / pymemcache packages and a server at CACHE_LOCATION).
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('CACHE_LOCATION', '/var/tmp/apexmotors_cache' if CACHE_BACKEND == 'file' else ''),
+        'OPTIONS': {'MAX_ENTRIES': 10000} if CACHE_BACKEND in ('locmem', 'file') else {},
     }
 }
 
+# Lifetime of cached page fragments, they are also invalidated on every write
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 3600))
+
+# Anonymous full-page cache: pages are fresh for PAGE_CACHE_TIMEOUT seconds
+# and served stale for up to PAGE_CACHE_GRACE more while being rebuilt
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 60))
+PAGE_CACHE_GRACE = int(os.environ.get('PAGE_CACHE_GRACE', 600))
+
+
+# Request instrumentation (web.middleware.RequestTimingMiddleware): a
+# Server-Timing header on every response, and a log line with the slowest
+# SQL statements for requests that take longer than SLOW_REQUEST_MS
+
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING', '1') == '1'
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_TOP_QUERIES = int(os.environ.get('SLOW_REQUEST_TOP_QUERIES', 5))
+
+# Prometheus metrics at /metrics/ (web.metrics). Gunicorn workers share them
+# through per-process files in METRICS_DIR, which should be on tmpfs
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+# Car documents are sent by nginx through X-Accel-Redirect when enabled
+# (web/documents.py), signed download links expire after DOCUMENT_URL_MAX_AGE
+X_ACCEL_REDIRECT = os.environ.get('X_ACCEL_REDIRECT', '0') == '1'
+DOCUMENT_URL_MAX_AGE = int(os.environ.get('DOCUMENT_URL_MAX_AGE', 3600))
+
+# Admin bulk actions on more cars than this are run by the job worker
+ADMIN_BULK_SYNC_LIMIT = int(os.environ.get('ADMIN_BULK_SYNC_LIMIT', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'web': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
 
 
 # Password validation
@@ -129,10 +214,36 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Tests render pages against freshly collected, hashed static files
+TEST_RUNNER = 'web.tests.runner.StaticTestRunner'
+
 STATICFILES_DIRS = [
     BASE_DIR / 'web' / 'static',
 ]
 
+# collectstatic writes content-hashed names (served by nginx with immutable
+# caching), the CSS bundles below and .gz/.br copies, see web/storage.py
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'web.storage.BundledManifestStaticFilesStorage'},
+}
+
+# name -> stylesheets concatenated into styles/bundle-<name>.css. Every page
+# links 'site' plus its own bundle with {% stylesheet %}.
+STATIC_BUNDLES = {
+    'site': ['styles/base.css', 'styles/navbar.css', 'styles/footer.css'],
+    'home': ['styles/home.css'],
+    'catalog': ['styles/cars.css'],
+    'detail': ['styles/detail.css'],
+    'profile': ['styles/profile.css', 'styles/cars.css'],
+    'add_car': ['styles/add_car.css'],
+    'edit_car': ['styles/edit_car.css'],
+    'delete_car': ['styles/delete_car.css'],
+    'login': ['styles/login.css'],
+    'register': ['styles/register.css'],
+    'about': ['styles/about.css'],
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
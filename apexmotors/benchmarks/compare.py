@@ -0,0 +1,59 @@
+"""
+Diff two benchmarks.views reports.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.2
+
+Prints every scenario side by side and exits with status 1 when head is
+slower than base by more than --threshold (a fraction) at p95, or runs more
+queries per request, so it can gate a CI job. Latency differences below
+--min-ms are ignored as noise.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as report:
+        return json.load(report)['results']
+
+
+def compare(base, head, threshold, min_ms):
+    """
+    Yield (scenario, metric, base value, head value, regressed) rows.
+    """
+    for name in sorted(base.keys() & head.keys()):
+        before, after = base[name], head[name]
+        for percentile in ('p50', 'p95', 'p99'):
+            old, new = before['latency_ms'][percentile], after['latency_ms'][percentile]
+            # Only p95 gates, p50 and p99 are shown for context
+            regressed = percentile == 'p95' and new - old > max(old * threshold, min_ms)
+            yield name, f'{percentile} ms', old, new, regressed
+        for metric in ('queries', 'peak_memory_kib', 'response_bytes'):
+            if metric in before and metric in after:
+                old, new = before[metric], after[metric]
+                yield name, metric, old, new, metric == 'queries' and new > old
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--min-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    failed = False
+    print(f"{'scenario':<20}{'metric':<18}{'base':>12}{'head':>12}{'change':>10}")
+    for name, metric, old, new, regressed in compare(base, head, args.threshold, args.min_ms):
+        change = f'{(new - old) / old:+.1%}' if old else '-'
+        print(f"{name:<20}{metric:<18}{old:>12}{new:>12}{change:>10}{'  REGRESSION' if regressed else ''}")
+        failed |= regressed
+    for name in sorted(base.keys() ^ head.keys()):
+        print(f"{name:<20}only in {'base' if name in base else 'head'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Requests per second with and without persistent database connections.
+
+    python -m benchmarks.db_connections --requests 2000
+
+Requests go through the Django test client and the full middleware stack.
+The test client skips the connection handling that CONN_MAX_AGE controls,
+so it is done here around each request the way the WSGI handler does. Uses
+the database configured in settings and only reads from it. The cache is
+swapped for a dummy one so every request reaches the database.
+"""
+import argparse
+import os
+import time
+
+
+def get(client, path):
+    from django.db import close_old_connections
+
+    # What WSGIHandler runs on request_started and request_finished
+    close_old_connections()
+    response = client.get(path)
+    close_old_connections()
+    assert response.status_code == 200, (path, response.status_code)
+
+
+def measure(client, path, requests):
+    for _ in range(min(50, requests)):
+        get(client, path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        get(client, path)
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--paths', nargs='+', default=['/ready/', '/catalog/'])
+    parser.add_argument('--max-age', type=int, default=60,
+                        help="CONN_MAX_AGE compared against 0 (a new connection per request).")
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apexmotors.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test import Client, override_settings
+
+    client = Client()
+    dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    results = {}
+    with override_settings(CACHES=dummy_cache, ALLOWED_HOSTS=['*']):
+        for max_age in (0, args.max_age):
+            # The lifetime is read when a connection opens
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+            for path in args.paths:
+                results[path, max_age] = measure(client, path, args.requests)
+
+    print(f"{'path':<20}{'CONN_MAX_AGE=0':>18}{f'CONN_MAX_AGE={args.max_age}':>18}{'speedup':>10}")
+    for path in args.paths:
+        before, after = results[path, 0], results[path, args.max_age]
+        print(f"{path:<20}{before:>14.0f} r/s{after:>14.0f} r/s{after / before:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
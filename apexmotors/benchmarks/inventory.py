@@ -0,0 +1,192 @@
+"""
+Seeded synthetic inventory for benchmarks.
+
+    python -m benchmarks.inventory --users 200 --cars 20000 --seed 1
+
+The same seed and sizes always produce the same rows, so timings from two
+runs are comparable. Distributions are skewed the way a real marketplace is:
+a few dealers own most listings, common brands outnumber exotics, most cars
+are a few years old, prices are log-normal per category, photo counts vary
+and comments concentrate on a small number of popular cars.
+
+Rows are written with bulk_create, so no signals run; covers, counters and
+hashtag counts are set afterwards in bulk and search vectors come from the
+database trigger. The CLI writes to the database configured in settings,
+benchmarks.views seeds a throwaway test database instead.
+"""
+import argparse
+import os
+import random
+
+MODELS = {
+    'Aston Martin': ['DB11', 'Vantage', 'DBS'],
+    'Audi': ['A4', 'A6', 'Q5', 'R8', 'RS6'],
+    'BMW': ['320i', 'M3', 'M5', 'X5', 'i4'],
+    'Bugatti': ['Chiron', 'Veyron'],
+    'Ferrari': ['296 GTB', 'F8', 'Roma', 'SF90'],
+    'Ford': ['Focus', 'Mustang', 'Ranger', 'Fiesta'],
+    'Lamborghini': ['Huracan', 'Urus', 'Aventador'],
+    'Mercedes-Benz': ['C 200', 'E 300', 'G 63', 'S 500'],
+    'Porsche': ['911', 'Cayenne', 'Macan', 'Taycan'],
+    'Tesla': ['Model 3', 'Model Y', 'Model S'],
+    'Toyota': ['Corolla', 'Camry', 'RAV4', 'Supra'],
+    'Volkswagen': ['Golf', 'Passat', 'Tiguan', 'Polo'],
+    'Other': ['Roadster', 'Coupe'],
+}
+
+# Relative listing frequency, everyday brands dominate
+BRAND_WEIGHTS = {
+    'Toyota': 20, 'Volkswagen': 18, 'Ford': 15, 'BMW': 12, 'Mercedes-Benz': 11,
+    'Audi': 10, 'Tesla': 6, 'Porsche': 4, 'Other': 4, 'Ferrari': 1.5,
+    'Lamborghini': 1, 'Aston Martin': 1, 'Bugatti': 0.2,
+}
+
+# category -> (weight, median price)
+CATEGORIES = {
+    'Sedan': (25, 28000), 'SUV': (22, 38000), 'Hatchback': (18, 18000),
+    'Coupe': (8, 45000), 'Sports': (8, 70000), 'Luxury': (7, 95000),
+    'Roadster': (4, 55000), 'Super': (3, 250000), 'Hyper': (0.5, 1500000),
+    'Other': (4.5, 20000),
+}
+
+HASHTAGS = [
+    'mint', 'lowmiles', 'fullservice', 'oneowner', 'v8', 'trackday', 'classic',
+    'daily', 'electric', 'hybrid', 'manual', 'supercharged', 'turbo', 'carbon',
+    'restored', 'barnfind', 'warranty', 'financing', 'export', 'rare',
+]
+
+COMMENT_PHRASES = [
+    'Is this still available?', 'What is the lowest price?', 'Beautiful car.',
+    'Any accident history?', 'Can I arrange a test drive?', 'Service book included?',
+    'How many previous owners?', 'Would you take a trade in?',
+]
+
+CURRENT_YEAR = 2025
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def make_car(rng, owner, number):
+    from web.models import Car
+
+    brand = weighted(rng, BRAND_WEIGHTS)
+    category = weighted(rng, {name: weight for name, (weight, _median) in CATEGORIES.items()})
+    age = min(int(rng.expovariate(1 / 5)), 50)
+    new = age == 0 and rng.random() < 0.6
+    median = CATEGORIES[category][1]
+    return Car(
+        owner=owner,
+        brand=brand,
+        model=rng.choice(MODELS[brand]),
+        category=category,
+        new_or_used='New' if new else 'Used',
+        year=CURRENT_YEAR - age,
+        price=int(median * rng.lognormvariate(0, 0.35) * 0.92 ** age) // 100 * 100,
+        mileage=rng.randint(0, 50) if new else max(0, int(rng.gauss(13000, 4000) * max(age, 1))),
+        color=rng.choice(Car.COLOR_CHOICES)[0],
+        fuel_type=rng.choices(['Petrol', 'Diesel', 'Electric', 'Hybrid'], weights=[55, 20, 15, 10])[0],
+        transmission=rng.choices(['Automatic', 'Manual', 'Semi-Automatic', 'CVT'], weights=[60, 25, 10, 5])[0],
+        drivetrain=rng.choice(['FWD', 'RWD', 'AWD', '4WD']),
+        horsepower=int(rng.lognormvariate(5.3, 0.45)),
+        description=f"{brand} {category.lower()} in good condition, ref {number}. "
+                    f"{rng.choice(['Garage kept', 'Recent service', 'New tyres', 'Full history'])}.",
+        stock_number=f'BENCH-{number}',
+    )
+
+
+def generate(seed=0, users=50, cars=2000, images_per_car=5, comments_per_car=1.5, batch_size=1000):
+    """
+    Create ``users`` users and ``cars`` cars with images, comments and
+    hashtags. Returns the number of rows created per model.
+    """
+    from django.contrib.auth.models import User
+    from django.contrib.auth.hashers import make_password
+    from django.db import transaction
+
+    from web import counters, hashtags
+    from web.models import Car, CarImage, Comment, CommentHashtag, Hashtag
+    from web.signals import first_image_subquery
+
+    rng = random.Random(seed)
+    # Hashing the same password once keeps seeding fast
+    password = make_password('benchmark')
+
+    with transaction.atomic():
+        people = User.objects.bulk_create([
+            User(username=f'bench-{seed}-{index}', password=password) for index in range(users)
+        ])
+        # Pareto distributed listing counts: a few dealers own most cars
+        seller_weights = [rng.paretovariate(1.2) for _ in people]
+
+        created_cars = []
+        for start in range(0, cars, batch_size):
+            batch = [
+                make_car(rng, rng.choices(people, weights=seller_weights)[0], f'{seed}-{number}')
+                for number in range(start, min(start + batch_size, cars))
+            ]
+            created_cars += Car.objects.bulk_create(batch)
+
+        images = []
+        for car in created_cars:
+            # Most listings have a handful of photos, some have none
+            count = 0 if rng.random() < 0.05 else min(1 + int(rng.expovariate(1 / images_per_car)), 20)
+            images += [
+                CarImage(car=car, image=f'car_images/bench/{car.pk}_{number}.jpg') for number in range(count)
+            ]
+        CarImage.objects.bulk_create(images, batch_size=batch_size)
+        Car.objects.filter(pk__in=[car.pk for car in created_cars]).update(cover=first_image_subquery())
+
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in HASHTAGS], ignore_conflicts=True)
+        tags = list(Hashtag.objects.filter(name__in=HASHTAGS).order_by('name'))
+        # Zipf-like popularity, the first few tags are used far more often
+        tag_weights = [1 / rank for rank in range(1, len(tags) + 1)]
+
+        # Comments follow car popularity, which is itself heavy tailed
+        popularity = [rng.paretovariate(1.5) for _ in created_cars]
+        total = int(cars * comments_per_car)
+        comments, comment_tags = [], []
+        for car in rng.choices(created_cars, weights=popularity, k=total):
+            chosen = set(rng.choices(tags, weights=tag_weights, k=rng.choice([0, 0, 1, 1, 2])))
+            text = rng.choice(COMMENT_PHRASES) + ''.join(f' #{tag.name}' for tag in chosen)
+            comments.append(Comment(user=rng.choice(people), car=car, text=text))
+            comment_tags.append(chosen)
+        comments = Comment.objects.bulk_create(comments, batch_size=batch_size)
+        CommentHashtag.objects.bulk_create(
+            [CommentHashtag(comment_id=comment.pk, hashtag_id=tag.pk, bucket=hashtags.hour_of(comment.created_at))
+             for comment, chosen in zip(comments, comment_tags) for tag in chosen],
+            batch_size=batch_size,
+        )
+        counters.recount([car.pk for car in created_cars])
+        # Trending and the tag pages read the counts, not the links
+        hashtags.rebuild_counts(batch_size)
+
+    return {
+        'users': len(people),
+        'cars': len(created_cars),
+        'images': len(images),
+        'comments': len(comments),
+        'hashtags': len(tags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--cars', type=int, default=2000)
+    parser.add_argument('--images-per-car', type=float, default=5)
+    parser.add_argument('--comments-per-car', type=float, default=1.5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apexmotors.settings')
+    import django
+    django.setup()
+
+    counts = generate(args.seed, args.users, args.cars, args.images_per_car, args.comments_per_car)
+    print(', '.join(f'{count} {name}' for name, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
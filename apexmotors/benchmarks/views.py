@@ -0,0 +1,253 @@
+"""
+Latency, queries and memory of the main pages on a seeded inventory.
+
+    python -m benchmarks.views --cars 5000 --requests 200 --output head.json
+    python -m benchmarks.compare base.json head.json
+
+By default a throwaway test database is created, filled by
+benchmarks.inventory with a fixed seed, and every scenario is driven through
+the Django test client with the full middleware stack. Per scenario the
+report has p50/p95/p99 latency, queries per request, response size and the
+peak Python memory allocated while serving one request (measured in a
+separate pass, tracemalloc slows everything down). The cache is a dummy one
+unless --cache is given, so views are measured rather than the page cache.
+
+With --url the same pages are requested over HTTP from a running server,
+e.g. gunicorn, by --concurrency threads. Paths are picked from the database
+in settings, which must be the one the server uses and already hold data
+(see benchmarks.inventory). Only latency and throughput are reported then,
+and pages that need a login are skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.request import urlopen
+
+
+class Scenario:
+    def __init__(self, name, path, user=None):
+        self.name = name
+        self.path = path
+        # Logged in as this user, anonymous when None
+        self.user = user
+
+
+def scenarios():
+    """
+    The pages to measure, pointed at the busiest rows so the numbers show
+    the worst case rather than an empty profile.
+    """
+    from django.contrib.auth.models import User
+    from django.db.models import Count
+    from django.urls import reverse
+
+    from web.models import Car
+
+    car = Car.objects.annotate(comment_total=Count('comments')).order_by('-comment_total', 'pk').first()
+    seller = User.objects.annotate(car_total=Count('cars')).order_by('-car_total', 'pk').first()
+    if car is None:
+        raise SystemExit("No cars to benchmark, seed the database with benchmarks.inventory first")
+    visitor = User.objects.exclude(pk=seller.pk).order_by('pk').first() or seller
+    catalog = reverse('catalog')
+    return [
+        Scenario('home', reverse('home')),
+        Scenario('catalog', catalog),
+        Scenario('catalog_filtered', f'{catalog}?brand=BMW&brand=Audi&year_min=2015&price_max=80000'),
+        Scenario('catalog_search', f'{catalog}?q=porsche'),
+        Scenario('car_detail', reverse('car_detail', args=[car.pk])),
+        Scenario('profile', reverse('profile', args=[seller.pk]), user=visitor),
+        Scenario('profile_listings', reverse('profile_listings', args=[seller.pk]), user=visitor),
+    ]
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = round(samples[0], 3) if samples else None
+        return {'p50': value, 'p95': value, 'p99': value}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50': round(cuts[49], 3), 'p95': round(cuts[94], 3), 'p99': round(cuts[98], 3)}
+
+
+def measure_client(scenario, requests, warmup):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+
+    def get():
+        response = client.get(scenario.path)
+        assert response.status_code == 200, (scenario.path, response.status_code)
+        return response
+
+    for _ in range(warmup):
+        get()
+
+    latencies, queries, size = [], [], 0
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = get()
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        size = len(response.content)
+
+    # Separate pass, tracing allocations would distort the timings above
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(requests, 5)):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        get()
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        'path': scenario.path,
+        'requests': requests,
+        'latency_ms': percentiles(latencies),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries': max(queries),
+        'response_bytes': size,
+        'peak_memory_kib': round(max(peaks) / 1024, 1),
+    }
+
+
+def measure_http(scenario, base_url, requests, warmup, concurrency):
+    url = base_url.rstrip('/') + scenario.path
+
+    def get(_):
+        started = time.perf_counter()
+        with urlopen(url, timeout=30) as response:
+            size = len(response.read())
+            assert response.status == 200, (url, response.status)
+        return (time.perf_counter() - started) * 1000, size
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(get, range(warmup)))
+        started = time.perf_counter()
+        results = list(pool.map(get, range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _size in results]
+    return {
+        'path': scenario.path,
+        'requests': requests,
+        'concurrency': concurrency,
+        'latency_ms': percentiles(latencies),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'requests_per_second': round(requests / elapsed, 1),
+        'response_bytes': results[-1][1],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    import django
+    from django.db import connection
+    from django.test import override_settings
+
+    from web.storage import collected_static
+
+    from . import inventory
+
+    results, created = {}, None
+    overrides = {'ALLOWED_HOSTS': ['*']}
+    if not args.cache:
+        overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+    def selected():
+        return [scenario for scenario in scenarios() if not args.only or scenario.name in args.only]
+
+    if args.url:
+        for scenario in selected():
+            if scenario.user is None:
+                results[scenario.name] = measure_http(
+                    scenario, args.url, args.requests, args.warmup, args.concurrency,
+                )
+    else:
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            created = inventory.generate(
+                args.seed, args.users, args.cars, args.images_per_car, args.comments_per_car,
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            with collected_static(), override_settings(**overrides):
+                for scenario in selected():
+                    results[scenario.name] = measure_client(scenario, args.requests, args.warmup)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {
+        'meta': {
+            'mode': 'http' if args.url else 'client',
+            'url': args.url,
+            'seed': args.seed,
+            'inventory': created,
+            'cache': args.cache,
+            'revision': git_revision(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'results': results,
+    }
+
+
+def print_report(report):
+    print(f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'peak KiB':>10}")
+    for name, result in report['results'].items():
+        latency = result['latency_ms']
+        queries = result.get('queries', '-')
+        memory = result.get('peak_memory_kib', '-')
+        print(f"{name:<20}{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}{queries:>9}{memory:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--cars', type=int, default=2000)
+    parser.add_argument('--images-per-car', type=float, default=5)
+    parser.add_argument('--comments-per-car', type=float, default=1.5)
+    parser.add_argument('--requests', type=int, default=100, help="Measured requests per scenario.")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--only', nargs='+', help="Scenario names to run, all by default.")
+    parser.add_argument('--cache', action='store_true', help="Keep the configured cache.")
+    parser.add_argument('--url', help="Base URL of a running server to load over HTTP instead.")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--output', help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apexmotors.settings')
+    import django
+    django.setup()
+
+    report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+            output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
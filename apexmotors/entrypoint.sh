@@ -3,21 +3,32 @@
 # Wait for the PostgreSQL database to become available
 echo "⏳ Waiting for PostgreSQL..."
 
-while ! nc -z db 5432; do
+while ! nc -z "${POSTGRES_HOST:-db}" "${POSTGRES_PORT:-5432}"; do
   sleep 1
 done
 
 echo "PostgreSQL is up!"
 
-# Apply database migrations
-echo "Applying database migrations..."
-python manage.py makemigrations --noinput
-python manage.py migrate --noinput
+# One-shot release step (the `release` service in docker-compose.yml), run
+# once per deploy before any web container starts
+if [ "$1" = "release" ]; then
+  # Migrations are committed with the code, never generated here
+  if python manage.py migrate --check >/dev/null 2>&1; then
+    echo "No migrations to apply."
+  else
+    echo "Applying database migrations..."
+    python manage.py migrate --noinput || exit 1
+  fi
 
-# Collect static files
-echo "Collecting static files..."
-python manage.py collectstatic --noinput --clear
+  echo "Collecting static files..."
+  exec python manage.py collectstatic_if_changed
+fi
 
-# Start Gunicorn server
+# Run another process from the same image (e.g. the job worker) instead of the web server
+if [ "$#" -gt 0 ]; then
+  exec "$@"
+fi
+
+# Start Gunicorn server, sized and tuned by gunicorn.conf.py
 echo "Starting Gunicorn..."
-exec gunicorn apexmotors.wsgi:application --bind 0.0.0.0:8000
+exec gunicorn --config gunicorn.conf.py
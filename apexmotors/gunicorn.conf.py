@@ -0,0 +1,100 @@
+"""
+Gunicorn runtime profile, loaded by entrypoint.sh.
+
+Workers and threads are sized from the CPUs this container may use. Every
+setting can be overridden from the environment:
+
+    GUNICORN_WORKER_CLASS   sync, gthread (default) or uvicorn (serves
+                            asgi.py, needs the uvicorn package)
+    GUNICORN_WORKERS        default 2 x CPUs + 1 for sync, CPUs + 1 otherwise
+    GUNICORN_THREADS        threads per gthread worker, default 4
+    GUNICORN_PRELOAD        load the app once in the master and fork it, so
+                            workers share its memory copy-on-write (default 1)
+    GUNICORN_MAX_REQUESTS   recycle a worker after this many requests
+                            (default 1000, with up to 10% jitter, 0 disables)
+    GUNICORN_TIMEOUT, GUNICORN_GRACEFUL_TIMEOUT, GUNICORN_KEEPALIVE, GUNICORN_BIND
+
+With METRICS_DIR set, the hooks below keep the per-worker metrics files of
+web.metrics: emptied at startup, flushed and archived when a worker exits.
+"""
+import os
+
+
+def cpu_count():
+    # The CPUs this process may run on, not the host total
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+cpus = cpu_count()
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+kind = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+worker_class = WORKER_CLASSES[kind]
+wsgi_app = 'apexmotors.asgi:application' if kind == 'uvicorn' else 'apexmotors.wsgi:application'
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = env_int('GUNICORN_WORKERS', 2 * cpus + 1 if kind == 'sync' else cpus + 1)
+threads = env_int('GUNICORN_THREADS', 4 if kind == 'gthread' else 1)
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Heartbeat files on tmpfs, a disk backed /tmp can stall workers in Docker
+worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+# nginx is the only client, trust its X-Forwarded-* headers
+forwarded_allow_ips = '*'
+
+
+metrics_dir = os.environ.get('METRICS_DIR')
+
+
+def on_starting(server):
+    # Metrics files of a previous run would be summed into this one
+    if metrics_dir:
+        from web import metrics
+        metrics.reset(metrics_dir)
+
+
+def worker_exit(server, worker):
+    if metrics_dir:
+        from web import metrics
+        metrics.flush(metrics_dir)
+
+
+def child_exit(server, worker):
+    # Keep the counts of recycled workers, /metrics must never go backwards
+    if metrics_dir:
+        from web import metrics
+        metrics.archive_process(metrics_dir, worker.pid)
+
+
+def post_fork(server, worker):
+    # Never share a database connection the master may have opened while
+    # preloading the app
+    from django.db import connections
+    connections.close_all()
+
+
+def when_ready(server):
+    server.log.info(
+        "%s %s workers x %s threads on %s CPUs", workers, kind, threads, cpus,
+    )
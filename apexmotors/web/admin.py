@@ -1,19 +1,88 @@
-from django.contrib import admin
-from .models import Car, CarImage, Hashtag, Comment, UserProfile
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Count, Sum
+from django.template.response import TemplateResponse
+
+from . import bulk, jobs
+from .models import Car, CarImage, Hashtag, Comment, Job, UserProfile
+
+class CarActionForm(ActionForm):
+    percent = forms.FloatField(required=False, label='Price change %')
+    category = forms.ChoiceField(choices=[('', '---------')] + Car.CATEGORY_CHOICES, required=False)
+
+    def clean_percent(self):
+        percent = self.cleaned_data['percent']
+        if percent is not None and percent <= bulk.MIN_PRICE_CHANGE:
+            raise forms.ValidationError("Prices can only be lowered by less than 100%.")
+        return percent
+
+
+def run_bulk(modeladmin, request, queryset, action, verb, **options):
+    """
+    Run a web.bulk operation, or queue it when the selection is too large to
+    finish within the admin request.
+    """
+    car_ids = list(queryset.values_list('pk', flat=True))
+    if bulk.is_large(car_ids):
+        jobs.enqueue('bulk_cars', action=action, car_ids=car_ids, **options)
+        modeladmin.message_user(request, f"{len(car_ids)} cars queued to be {verb}.")
+    else:
+        count = bulk.ACTIONS[action](car_ids, **options)
+        modeladmin.message_user(request, f"{count} cars {verb}.")
+
 
 @admin.action(description='Duplicate selected car(s)')
 def duplicate_cars(modeladmin, request, queryset):
-    for obj in queryset:
-        images = list(obj.images.all())  # assuming related_name='images' on CarImage
-        obj.pk = None  # Create a new instance
-        obj.model += " (Copy)"  # Optional: append "Copy" to model name
-        obj.save()
-
-        # Duplicate related CarImage instances
-        for image in images:
-            image.pk = None
-            image.car = obj
-            image.save()
+    run_bulk(modeladmin, request, queryset, 'duplicate_cars', 'duplicated')
+
+
+@admin.action(description='Change price of selected car(s) by the given %%')
+def change_prices(modeladmin, request, queryset):
+    # CarActionForm has already checked the value
+    percent = request.POST.get('percent')
+    if not percent:
+        modeladmin.message_user(request, "Enter a price change in percent.", messages.ERROR)
+        return
+    run_bulk(modeladmin, request, queryset, 'change_prices', 'repriced', percent=float(percent))
+
+
+@admin.action(description='Move selected car(s) to the given category')
+def set_category(modeladmin, request, queryset):
+    category = request.POST.get('category')
+    if category not in dict(Car.CATEGORY_CHOICES):
+        modeladmin.message_user(request, "Choose a category.", messages.ERROR)
+        return
+    run_bulk(modeladmin, request, queryset, 'set_category', 'recategorized', category=category)
+
+
+@admin.action(description='Delete selected car(s)', permissions=['delete'])
+def delete_cars(modeladmin, request, queryset):
+    # Confirm first, like the stock delete_selected, but summarize the
+    # selection from the counters instead of listing every related row
+    if request.POST.get('post') != 'yes':
+        summary = queryset.aggregate(
+            cars=Count('pk'), images=Sum('image_count'),
+            comments=Sum('comment_count'), purchases=Sum('purchase_count'),
+        )
+        select_across = request.POST.get('select_across') == '1'
+        car_ids = queryset.values_list('pk', flat=True)
+        if select_across:
+            # The filters in the URL pick the cars again, one id is only
+            # there so the changelist runs the action
+            car_ids = car_ids[:1]
+        return TemplateResponse(request, 'admin/web/car/delete_cars_confirmation.html', {
+            **modeladmin.admin_site.each_context(request),
+            'title': 'Are you sure?',
+            'opts': modeladmin.model._meta,
+            'summary': summary,
+            'select_across': select_across,
+            'car_ids': car_ids,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'media': modeladmin.media,
+        })
+    run_bulk(modeladmin, request, queryset, 'delete_cars', 'deleted')
 
 class CarImageInline(admin.TabularInline):
     model = CarImage
@@ -30,12 +99,37 @@ class CarAdmin(admin.ModelAdmin):
     list_display = ('brand', 'model', 'category', 'price', 'year', 'new_or_used')
     list_filter = ('category', 'new_or_used', 'year')
     search_fields = ('brand', 'model', 'description', 'color', 'engine')
+    readonly_fields = ('cover',)  # maintained by web.signals from the image inline
     inlines = [CarImageInline, CommentInline]
-    actions = [duplicate_cars]
+    action_form = CarActionForm
+    actions = [duplicate_cars, change_prices, set_category, delete_cars]
+
+    def response_action(self, request, queryset):
+        # An invalid percent fails the whole action form, which the
+        # changelist only reports as "No action selected"
+        form = self.action_form(request.POST, auto_id=None)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() and 'percent' in form.errors:
+            self.message_user(request, form.errors['percent'][0], messages.ERROR)
+            return None
+        return super().response_action(request, queryset)
+
+    def get_actions(self, request):
+        # The stock delete_selected deletes row by row, delete_cars replaces it
+        # with the same confirmation step
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
 
 @admin.register(Hashtag)
 class HashtagAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_until', 'last_error')
+
 admin.site.register(UserProfile)
@@ -0,0 +1,104 @@
+"""
+Query budgets for views.
+
+Every view in web.urls declares the most SQL queries one GET request may
+run, session and user lookups included:
+
+    @query_budget(6)
+    def catalog(request):
+        ...
+
+A budget is a constant, it has to hold however many cars, images or
+comments the page shows. A query inside a template loop (an N+1) therefore
+breaks it as soon as there is more than one row. web/tests/test_query_budgets
+requests every view with one row and with a hundred, and QueryRecorder points
+each extra query at the template line (or Python line) that ran it.
+
+Budgets cover GET requests only. Form submissions write rows, send signals
+and redirect, so they run more queries than the page they post from and
+are not checked.
+"""
+import os
+import sys
+from collections import Counter
+
+from django.db import connection
+from django.template.base import Node, TokenType
+
+_RENDER_ANNOTATED = Node.render_annotated.__code__
+_WEB_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Pass-through frames that never issue queries themselves
+_SKIP_FILES = tuple(os.path.join(_WEB_ROOT, name) for name in ('budgets.py', 'middleware.py'))
+
+
+def query_budget(queries):
+    """
+    Declare that a GET of the decorated view runs at most ``queries`` queries.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def budget_for(view):
+    # functools.wraps copies the attribute onto any decorator applied later
+    return getattr(view, 'query_budget', None)
+
+
+def template_location(node):
+    token = node.token
+    if token.token_type == TokenType.VAR:
+        source = f'{{{{ {token.contents} }}}}'
+    else:
+        source = f'{{% {token.contents} %}}'
+    return f'{node.origin.template_name}:{token.lineno} {source}'
+
+
+def query_location(frame):
+    """
+    Describe where the query running under ``frame`` came from: the innermost
+    template node being rendered, else the innermost line of code in web/.
+    """
+    code_line = None
+    while frame is not None:
+        if frame.f_code is _RENDER_ANNOTATED:
+            node = frame.f_locals.get('self')
+            if getattr(node, 'token', None) is not None and getattr(node, 'origin', None) is not None:
+                return template_location(node)
+        elif (code_line is None and frame.f_code.co_filename.startswith(_WEB_ROOT)
+              and not frame.f_code.co_filename.startswith(_SKIP_FILES)):
+            filename = os.path.relpath(frame.f_code.co_filename, os.path.dirname(_WEB_ROOT))
+            code_line = f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}()'
+        frame = frame.f_back
+    # Session and user lookups by Django's own middleware
+    return code_line or 'outside web/'
+
+
+class QueryRecorder:
+    """
+    Record every query run on the default connection inside the block,
+    with the template or code location that issued it.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        self.queries.append((sql, query_location(sys._getframe(1))))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def locations(self):
+        return Counter(location for _sql, location in self.queries)
@@ -0,0 +1,152 @@
+"""
+Set-based operations on many cars at once, used by the admin actions.
+
+Each operation runs in one transaction and touches the database once per
+batch of BATCH_SIZE cars rather than once per row. bulk_create() and
+update() send no model signals, and deletes run with web.signals muted, so
+the cache and job bookkeeping the signals normally do is done here once.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField, IntegerField
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from . import hashtags, jobs
+from .cache import bump_car_version, bump_catalog_version
+from .models import Car, CarImage
+from .signals import first_image_subquery, muted
+
+BATCH_SIZE = 500
+
+# change_prices() takes percentages above this, -100% would zero every price
+MIN_PRICE_CHANGE = -100
+
+
+def batches(ids, size=BATCH_SIZE):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def is_large(car_ids):
+    """
+    Whether an admin request should hand ``car_ids`` to the job worker.
+    """
+    return len(car_ids) > settings.ADMIN_BULK_SYNC_LIMIT
+
+
+@transaction.atomic
+def duplicate_cars(car_ids):
+    """
+    Copy cars and their images. Image copies point at the same files and
+    renditions, so nothing is uploaded or rendered again.
+    """
+    created = 0
+    for batch in batches(car_ids):
+        originals = list(Car.objects.filter(pk__in=batch).order_by('pk'))
+        copies = []
+        for car in originals:
+            copy = Car(**{
+                field.attname: getattr(car, field.attname)
+                for field in Car._meta.concrete_fields
+                if not field.primary_key
+            })
+            copy.model = f"{car.model} (Copy)"
+            copy.cover_id = None
+            # The dealer's stock number stays with the original listing
+            copy.stock_number = None
+            # Images are copied below, comments and purchases are not
+            copy.comment_count = copy.purchase_count = 0
+            copies.append(copy)
+        Car.objects.bulk_create(copies)
+        copy_ids = {car.pk: copy.pk for car, copy in zip(originals, copies)}
+
+        images = CarImage.objects.filter(car_id__in=batch).order_by('pk')
+        CarImage.objects.bulk_create(
+            [
+                CarImage(car_id=copy_ids[car_id], image=image, renditions_for=renditions_for)
+                for car_id, image, renditions_for in images.values_list('car_id', 'image', 'renditions_for')
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Car.objects.filter(pk__in=copy_ids.values()).update(cover=first_image_subquery())
+        created += len(copies)
+
+    transaction.on_commit(bump_catalog_version)
+    return created
+
+
+@transaction.atomic
+def change_prices(car_ids, percent):
+    """
+    Raise (or with a negative ``percent`` lower) prices, rounded to whole units.
+    """
+    if percent <= MIN_PRICE_CHANGE:
+        raise ValueError(f"Price change must be above {MIN_PRICE_CHANGE}%, got {percent}%")
+    factor = 1 + percent / 100
+    updated = 0
+    for batch in batches(car_ids):
+        updated += Car.objects.filter(pk__in=batch).update(
+            price=Round(ExpressionWrapper(F('price') * factor, output_field=FloatField()),
+                        output_field=IntegerField()),
+            updated_at=timezone.now(),
+        )
+    invalidate(car_ids)
+    return updated
+
+
+@transaction.atomic
+def set_category(car_ids, category):
+    updated = 0
+    for batch in batches(car_ids):
+        updated += Car.objects.filter(pk__in=batch).update(
+            category=category, updated_at=timezone.now(),
+        )
+    invalidate(car_ids)
+    return updated
+
+
+@transaction.atomic
+def delete_cars(car_ids):
+    """
+    Delete cars with their images and comments, then queue removal of
+    rendition files no other image still uses.
+    """
+    deleted = 0
+    sources = set()
+    for batch in batches(car_ids):
+        sources.update(
+            CarImage.objects.filter(car_id__in=batch)
+            .exclude(renditions_for='')
+            .values_list('renditions_for', flat=True)
+        )
+        # The muted signals would have taken the comments' hashtag mentions
+        # out of the hourly buckets
+        hashtags.forget_cars(batch)
+        with muted():
+            _total, per_model = Car.objects.filter(pk__in=batch).delete()
+        deleted += per_model.get(Car._meta.label, 0)
+
+    # delete_rendition_files itself skips files that are still in use
+    jobs.enqueue_many('delete_rendition_files', [{'source_name': name} for name in sorted(sources)])
+    invalidate(car_ids)
+    return deleted
+
+
+def invalidate(car_ids):
+    car_ids = list(car_ids)
+
+    def bump():
+        bump_car_version(*car_ids)
+        bump_catalog_version()
+    transaction.on_commit(bump)
+
+
+# Operations the admin can hand to the job worker, see tasks.bulk_cars
+ACTIONS = {
+    'duplicate_cars': duplicate_cars,
+    'change_prices': change_prices,
+    'set_category': set_category,
+    'delete_cars': delete_cars,
+}
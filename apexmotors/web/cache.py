@@ -0,0 +1,180 @@
+"""
+Versioned cache keys and the anonymous page cache.
+
+Every car has an opaque version token that is part of the key of each cached
+fragment of its detail page (see detail.html). Writing the car, one of its
+images or one of its comments replaces the token once the write commits
+(web.signals), so stale fragments are simply never looked up again and
+expire on their own. Tokens are random rather than counters, so an evicted
+token can never bring an old fragment back.
+
+Whole pages for anonymous visitors are cached by cache_anonymous_page(),
+checked against a single catalog version that changes on any Car or
+CarImage write, plus any versions the view adds for what else it depends
+on (e.g. the counter a catalog page is sorted by). Expired pages are rebuilt by one request at a time while
+the others keep getting the stale copy. A cached page is sent with the ETag
+and Last-Modified it was rendered under, never with fresher ones.
+"""
+import hashlib
+import time
+import uuid
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# How long a rebuilding request may hold the single-flight lock
+REBUILD_LOCK_TIMEOUT = 30
+
+
+def new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # add() so concurrent first requests agree on one token
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def car_version_key(car_id):
+    return f'car:{car_id}:version'
+
+
+def car_version(car_id):
+    return get_version(car_version_key(car_id))
+
+
+def bump_car_version(*car_ids):
+    cache.set_many({car_version_key(car_id): new_version() for car_id in car_ids}, timeout=None)
+
+
+def catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, new_version(), timeout=None)
+
+
+def counter_version_key(field):
+    return f'counter:{field}:version'
+
+
+def counter_version(field):
+    return get_version(counter_version_key(field))
+
+
+def bump_counter_version(field):
+    cache.set(counter_version_key(field), new_version(), timeout=None)
+
+
+def hashtag_version_key(name):
+    return f'hashtag:{name}:version'
+
+
+def hashtag_version(name):
+    return get_version(hashtag_version_key(name))
+
+
+def bump_hashtag_versions(*names):
+    cache.set_many({hashtag_version_key(name): new_version() for name in names}, timeout=None)
+
+
+def page_cache_key(request):
+    # Same filters in a different order or encoding share one entry
+    query = urlencode(sorted((key, sorted(values)) for key, values in request.GET.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'page:{digest}'
+
+
+def cached_response(request, entry, status):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = status
+    validators = entry.get('validators')
+    if validators is None:
+        return response
+    # The body may predate the current catalog, so it goes out with the
+    # validators it was rendered under, which condition() leaves alone
+    last_modified = validators['last_modified'] and int(validators['last_modified'].timestamp())
+    response['ETag'] = validators['etag']
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return get_conditional_response(
+        request, etag=validators['etag'], last_modified=last_modified, response=response,
+    )
+
+
+def cache_anonymous_page(view=None, *, versions=None):
+    """
+    Serve ``view`` from the page cache for anonymous GET and HEAD requests.
+
+    ``versions(request, *args, **kwargs)`` may return extra version tokens
+    the page depends on besides the catalog version, see views.catalog:
+
+        @cache_anonymous_page(versions=catalog_versions)
+    """
+    if view is None:
+        return partial(cache_anonymous_page, versions=versions)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        entry = cache.get(key)
+        version = catalog_version()
+        if versions is not None:
+            version = (version, *versions(request, *args, **kwargs))
+
+        if entry is not None:
+            fresh = entry['version'] == version and entry['expires'] > time.time()
+            if fresh:
+                return cached_response(request, entry, 'HIT')
+            # Single flight: whoever gets the lock rebuilds, everyone else
+            # keeps serving the stale copy meanwhile
+            if not cache.add(f'{key}:lock', 1, REBUILD_LOCK_TIMEOUT):
+                return cached_response(request, entry, 'STALE')
+            try:
+                return store_page(request, key, version, view(request, *args, **kwargs))
+            finally:
+                cache.delete(f'{key}:lock')
+
+        return store_page(request, key, version, view(request, *args, **kwargs))
+
+    return wrapper
+
+
+def store_page(request, key, version, response):
+    # Anything that would set a cookie later in the middleware makes the
+    # page specific to this visitor
+    session = getattr(request, 'session', None)
+    cacheable = (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not (session is not None and session.modified)
+    )
+    if cacheable:
+        entry = {
+            'version': version,
+            'expires': time.time() + settings.PAGE_CACHE_TIMEOUT,
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            # Set by web.conditional.validated() on views that use it
+            'validators': getattr(request, 'validators', None),
+        }
+        # Kept past its expiry so there is a stale copy to serve during rebuilds
+        cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_GRACE)
+        response['X-Page-Cache'] = 'MISS'
+    return response
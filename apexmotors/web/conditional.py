@@ -0,0 +1,79 @@
+"""
+Validators for conditional GETs.
+
+Each view gets an ETag and Last-Modified computed from Car.updated_at with a
+single indexed query, so django.views.decorators.http.condition() can answer
+If-None-Match / If-Modified-Since with a 304 before the view runs. ETags also
+cover the viewing user, whose navigation and forms differ, and listing ETags
+include the catalog version so deleted cars invalidate them too.
+
+Pages served from the anonymous page cache carry the validators stored with
+the cached body instead (web.cache), so a browser never keeps an old body
+under a new ETag.
+"""
+import hashlib
+
+from django.db.models import Max
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from .cache import catalog_version
+from .models import Car
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def viewer(request):
+    return request.user.pk if request.user.is_authenticated else 'anonymous'
+
+
+def validated(state_func):
+    """
+    condition() with both validators taken from one call of
+    ``state_func(request, *args, **kwargs)``, which returns the last
+    modification time and a list of extra ETag parts, or None to skip.
+    """
+    def state(request, *args, **kwargs):
+        # condition() asks for the ETag and Last-Modified separately
+        if not hasattr(request, 'validators'):
+            result = state_func(request, *args, **kwargs)
+            request.validators = None
+            if result is not None:
+                last_modified, parts = result
+                # Also kept with cached pages, see web.cache.store_page()
+                request.validators = {
+                    'etag': quote_etag(make_etag(last_modified, viewer(request), *parts)),
+                    'last_modified': last_modified,
+                }
+        return request.validators
+
+    def etag(request, *args, **kwargs):
+        validators = state(request, *args, **kwargs)
+        if validators is not None:
+            return validators['etag']
+
+    def last_modified(request, *args, **kwargs):
+        validators = state(request, *args, **kwargs)
+        if validators is not None:
+            return validators['last_modified']
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def catalog_state(request, *args, **kwargs):
+    last_modified = Car.objects.aggregate(last=Max('updated_at'))['last']
+    return last_modified, [catalog_version()]
+
+
+def profile_state(request, user_id):
+    last_modified = Car.objects.filter(owner_id=user_id).aggregate(last=Max('updated_at'))['last']
+    return last_modified, [catalog_version()]
+
+
+def car_state(request, pk):
+    last_modified = Car.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if last_modified is None:
+        return None
+    return last_modified, []
@@ -0,0 +1,79 @@
+"""
+Denormalized per-car row counts.
+
+Car.image_count, comment_count and purchase_count mirror the number of
+related CarImage, Comment and Purchase rows, so pages can show and sort by
+them without a COUNT per card. web.signals adjusts them with a single
+UPDATE ... SET x = x + 1 whenever a row is created or deleted, which is safe
+under concurrent writes. Bulk code paths that skip signals call recount()
+for the cars they touched; `manage.py repair_counters` recounts everything.
+
+Catalog cards show and sort by the LISTED counters. Changing one replaces
+that counter's version once the write commits, which only the catalog
+pages sorted by it depend on (views.catalog). Cards on other pages may show
+the old count until their cached copy expires, and the car's own detail
+fragments are replaced by web.signals.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .cache import bump_car_version, bump_catalog_version, bump_counter_version
+from .models import Car, CarImage, Comment, Purchase
+
+# counter field -> (model, foreign key to Car)
+COUNTERS = {
+    'image_count': (CarImage, 'car'),
+    'comment_count': (Comment, 'car'),
+    'purchase_count': (Purchase, 'car'),
+}
+
+# Counters shown on catalog cards (cars.html)
+LISTED = ('image_count', 'comment_count')
+
+
+def counter_for(model):
+    for field, (counted, _fk) in COUNTERS.items():
+        if counted is model:
+            return field
+    return None
+
+
+def adjust(car_id, field, delta):
+    # Never below zero, even if a delete races a repair
+    Car.objects.filter(pk=car_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+    if field in LISTED:
+        transaction.on_commit(partial(bump_counter_version, field))
+
+
+def count_subquery(model, fk):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk: OuterRef('pk')}).order_by()
+            .values(fk).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def recount(car_ids=None):
+    """
+    Recompute the counters of ``car_ids`` (all cars when None) and return
+    the ids of the cars whose counters were wrong.
+    """
+    queryset = Car.objects.all() if car_ids is None else Car.objects.filter(pk__in=car_ids)
+    counts = {field: count_subquery(model, fk) for field, (model, fk) in COUNTERS.items()}
+    drifted = Q()
+    for field in COUNTERS:
+        drifted |= ~Q(**{field: F(f'actual_{field}')})
+    # Only rows that drifted are rewritten
+    stale = queryset.alias(**{f'actual_{field}': value for field, value in counts.items()}).filter(drifted)
+    stale_ids = list(stale.values_list('pk', flat=True))
+    if stale_ids:
+        Car.objects.filter(pk__in=stale_ids).update(**counts)
+        transaction.on_commit(partial(bump_car_version, *stale_ids))
+        transaction.on_commit(bump_catalog_version)
+    return stale_ids
@@ -0,0 +1,67 @@
+"""
+Car document downloads.
+
+Django only decides whether a download is allowed. The file itself is sent
+by nginx: the response carries an X-Accel-Redirect to the internal
+/protected/media/ location (see nginx.conf), so nginx streams it with
+sendfile and handles Range requests, and no gunicorn worker is held for the
+length of the download. Without nginx in front (X_ACCEL_REDIRECT off) the
+file is streamed by Django instead.
+
+Download links are signed and expire after DOCUMENT_URL_MAX_AGE seconds, so
+checking one needs no database query.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+
+SALT = 'web.documents'
+
+# Internal nginx location aliased to MEDIA_ROOT
+ACCEL_PREFIX = '/protected/media/'
+
+
+def signed_url(name):
+    return reverse('signed_document', args=[signing.dumps(name, salt=SALT, compress=True)])
+
+
+def unsign(token):
+    """
+    The document name in ``token``. Raises signing.BadSignature (or its
+    subclass SignatureExpired) for forged or expired links.
+    """
+    return signing.loads(token, salt=SALT, max_age=settings.DOCUMENT_URL_MAX_AGE)
+
+
+def resolve(name):
+    """
+    Absolute path of the stored file ``name``, or None when it does not
+    exist or lies outside MEDIA_ROOT.
+    """
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def serve(path):
+    filename = os.path.basename(path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if settings.X_ACCEL_REDIRECT:
+        relative = os.path.relpath(path, os.path.realpath(settings.MEDIA_ROOT))
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = ACCEL_PREFIX + quote(relative)
+        response['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(filename)}"
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type, filename=filename)
+
+    # The URL is only valid until it expires, let the browser keep it as long
+    response['Cache-Control'] = f'private, max-age={settings.DOCUMENT_URL_MAX_AGE}'
+    return response
@@ -0,0 +1,75 @@
+"""
+Full-inventory exports as CSV or JSON Lines.
+
+Rows are read through a server-side cursor (QuerySet.iterator()) and turned
+into text one at a time, so memory stays flat however many cars match. Image
+URLs come from a correlated subquery in the same SELECT and comment counts
+from the denormalized Car.comment_count, instead of a query per car. The
+columns match what import_cars reads.
+"""
+import csv
+import json
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.files.storage import default_storage
+from django.db.models import OuterRef
+
+from .forms import CarForm
+from .models import CarImage
+from .search import filter_cars
+
+FIELDS = ['id', 'stock_number'] + [name for name in CarForm.Meta.fields if name != 'document']
+COLUMNS = FIELDS + ['owner', 'images', 'comment_count']
+
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def export_queryset(params):
+    """
+    Cars matching cleaned CarSearchForm data, as dicts in id order.
+    """
+    images = CarImage.objects.filter(car=OuterRef('pk')).order_by('pk').values('image')
+    # values() leaves the rank and snippet annotations of text searches out
+    # of the SELECT, only their filter is kept
+    return (
+        filter_cars(params)
+        .annotate(image_names=ArraySubquery(images))
+        .order_by('pk')
+        .values(*FIELDS, 'owner__username', 'image_names', 'comment_count')
+    )
+
+
+def export_rows(params, base_url=''):
+    for car in export_queryset(params).iterator(chunk_size=CHUNK_SIZE):
+        car['owner'] = car.pop('owner__username')
+        car['available_colors'] = list(car['available_colors'])
+        car['images'] = [base_url + default_storage.url(name) for name in car.pop('image_names')]
+        yield car
+
+
+class Echo:
+    # csv.writer only needs write(), hand each line straight back
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([
+            '|'.join(value) if isinstance(value, list) else value
+            for value in (row[column] for column in COLUMNS)
+        ])
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps({column: row[column] for column in COLUMNS}) + '\n'
+
+
+def export_lines(params, fmt, base_url=''):
+    rows = export_rows(params, base_url)
+    return csv_lines(rows) if fmt == 'csv' else jsonl_lines(rows)
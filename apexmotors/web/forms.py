@@ -31,4 +31,29 @@ class CustomUserCreationForm(UserCreationForm):
 
     class Meta:
         model = User
-        fields = ['username', 'email', 'password1', 'password2', 'phone', 'address', 'favorite_brand']
\ No newline at end of file
+        fields = ['username', 'email', 'password1', 'password2', 'phone', 'address', 'favorite_brand']
+
+class CarSearchForm(forms.Form):
+    q = forms.CharField(max_length=100, required=False)
+
+    brand = forms.MultipleChoiceField(choices=Car.BRAND_CHOICES, required=False)
+    category = forms.MultipleChoiceField(choices=Car.CATEGORY_CHOICES, required=False)
+    fuel_type = forms.MultipleChoiceField(choices=Car.FUEL_TYPE, required=False)
+    transmission = forms.MultipleChoiceField(choices=Car.TRANMISSION_TYPE, required=False)
+    drivetrain = forms.MultipleChoiceField(choices=Car.DRIVE_TRAIN, required=False)
+    new_or_used = forms.MultipleChoiceField(choices=Car.NEW_USED_CHOICES, required=False)
+
+    year_min = forms.IntegerField(required=False)
+    year_max = forms.IntegerField(required=False)
+    price_min = forms.IntegerField(required=False, min_value=0)
+    price_max = forms.IntegerField(required=False, min_value=0)
+    mileage_min = forms.IntegerField(required=False, min_value=0)
+    mileage_max = forms.IntegerField(required=False, min_value=0)
+
+    # Empty means relevance for text searches, newest otherwise
+    sort = forms.ChoiceField(choices=[
+        ('', 'Best match'),
+        ('newest', 'Newest'),
+        ('photos', 'Most photos'),
+        ('comments', 'Most discussed'),
+    ], required=False)
@@ -0,0 +1,197 @@
+"""
+Hashtags parsed from comment text, and the counts built from them.
+
+When a comment is saved, web.signals calls sync_comment(). It extracts every
+#tag from the text, creates the missing Hashtag rows with one
+bulk_create(ignore_conflicts=True) and links them through the
+CommentHashtag table, which records the hour each mention is counted in.
+Each mention that is added or removed also adjusts two counter tables with
+atomic UPDATE ... SET count = count +/- 1:
+
+    HashtagBucket   mentions per tag and hour, summed for trending()
+    CarHashtag      mentions per tag and car, for the "cars tagged #x" page
+
+so neither page ever scans comments. A change to a tag's counts replaces
+that tag's version once it commits, which its cached tag pages depend on
+(views.hashtag_cars). The trending list on the cached home page may lag by
+up to PAGE_CACHE_TIMEOUT. `manage.py rebuild_hashtags` relinks existing
+comments and rebuilds both tables from scratch with rebuild_counts().
+"""
+import re
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import bump_catalog_version, bump_hashtag_versions
+from .models import CarHashtag, CommentHashtag, Hashtag, HashtagBucket
+
+# "#" at the start of a word, followed by letters, digits or underscores
+HASHTAG_RE = re.compile(r'(?<![\w#&])#(\w+)')
+
+MAX_LENGTH = Hashtag._meta.get_field('name').max_length
+
+TRENDING_WINDOW = timedelta(hours=24)
+TRENDING_LIMIT = 10
+
+
+def extract(text):
+    """
+    Lowercased hashtag names in ``text``, in order of first appearance.
+    """
+    names = {}
+    for match in HASHTAG_RE.finditer(text or ''):
+        name = match.group(1).lower()[:MAX_LENGTH]
+        names.setdefault(name, None)
+    return list(names)
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def adjust_counts(car_id, bucket, hashtags, delta):
+    """
+    Add ``delta`` to the bucket and car counters of ``hashtags``, a dict of
+    hashtag id -> name.
+    """
+    if not hashtags:
+        return
+    if delta > 0:
+        # Make sure the rows exist, concurrent writers agree through the
+        # unique constraints and the UPDATE below then increments atomically
+        HashtagBucket.objects.bulk_create(
+            [HashtagBucket(hashtag_id=pk, bucket=bucket) for pk in hashtags], ignore_conflicts=True,
+        )
+        CarHashtag.objects.bulk_create(
+            [CarHashtag(car_id=car_id, hashtag_id=pk) for pk in hashtags], ignore_conflicts=True,
+        )
+    counted = Greatest(F('count') + delta, Value(0))
+    buckets = HashtagBucket.objects.filter(hashtag_id__in=hashtags, bucket=bucket)
+    buckets.update(count=counted)
+    mentions = CarHashtag.objects.filter(car_id=car_id, hashtag_id__in=hashtags)
+    mentions.update(count=counted)
+    if delta < 0:
+        buckets.filter(count=0).delete()
+        mentions.filter(count=0).delete()
+    transaction.on_commit(partial(bump_hashtag_versions, *hashtags.values()))
+
+
+def uncount_links(car_id, links):
+    """
+    Take ``links``, (hashtag id, name, bucket) tuples of one car's comments,
+    out of the counts, each from the hour it was counted in.
+    """
+    by_bucket = defaultdict(dict)
+    for pk, name, bucket in links:
+        by_bucket[bucket][pk] = name
+    for bucket, hashtags in by_bucket.items():
+        adjust_counts(car_id, bucket, hashtags, -1)
+
+
+def sync_comment(comment, created=False):
+    """
+    Link ``comment`` to the hashtags in its text and count the mentions
+    that were added or removed. Mentions an edit adds count in the hour of
+    the edit.
+    """
+    names = extract(comment.text)
+    linked = {} if created else {
+        name: (pk, bucket)
+        for name, pk, bucket in CommentHashtag.objects.filter(comment=comment)
+        .values_list('hashtag__name', 'hashtag_id', 'bucket')
+    }
+
+    added = [name for name in names if name not in linked]
+    if added:
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in added], ignore_conflicts=True)
+        added_ids = dict(Hashtag.objects.filter(name__in=added).values_list('pk', 'name'))
+        bucket = hour_of(comment.created_at if created else timezone.now())
+        CommentHashtag.objects.bulk_create(
+            [CommentHashtag(comment_id=comment.pk, hashtag_id=pk, bucket=bucket) for pk in added_ids],
+            ignore_conflicts=True,
+        )
+        adjust_counts(comment.car_id, bucket, added_ids, 1)
+
+    removed = [(pk, name, bucket) for name, (pk, bucket) in linked.items() if name not in names]
+    if removed:
+        removed_ids = [pk for pk, _name, _bucket in removed]
+        CommentHashtag.objects.filter(comment_id=comment.pk, hashtag_id__in=removed_ids).delete()
+        uncount_links(comment.car_id, removed)
+
+
+def forget_comment(comment):
+    """
+    Take the mentions of a comment about to be deleted out of the counts.
+    """
+    links = CommentHashtag.objects.filter(comment=comment).values_list('hashtag_id', 'hashtag__name', 'bucket')
+    uncount_links(comment.car_id, links)
+
+
+def forget_cars(car_ids):
+    """
+    Take the mentions in the comments of cars about to be deleted out of the
+    hourly buckets, for bulk deletes that run with the signals muted. Their
+    CarHashtag rows are deleted with the cars.
+    """
+    totals = {
+        (row['hashtag_id'], row['bucket']): row['total']
+        for row in CommentHashtag.objects.filter(comment__car_id__in=car_ids)
+        .values('hashtag_id', 'bucket').annotate(total=Count('pk')).order_by()
+    }
+    if not totals:
+        return
+    # Locked, so concurrent comments wait rather than have their increments
+    # overwritten
+    buckets = HashtagBucket.objects.select_for_update().filter(
+        hashtag_id__in={pk for pk, _bucket in totals}, bucket__in={bucket for _pk, bucket in totals},
+    ).order_by('pk')
+    kept, emptied = [], []
+    for row in buckets:
+        if (row.hashtag_id, row.bucket) in totals:
+            row.count = max(row.count - totals[row.hashtag_id, row.bucket], 0)
+            (kept if row.count else emptied).append(row)
+    HashtagBucket.objects.bulk_update(kept, ['count'])
+    HashtagBucket.objects.filter(pk__in=[row.pk for row in emptied]).delete()
+
+
+def rebuild_counts(batch_size=1000):
+    """
+    Recount HashtagBucket and CarHashtag from the comment links, in one
+    transaction so readers see either the old counts or the new ones.
+    """
+    with transaction.atomic():
+        HashtagBucket.objects.all().delete()
+        CarHashtag.objects.all().delete()
+        buckets = CommentHashtag.objects.values('hashtag_id', 'bucket').annotate(count=Count('pk')).order_by()
+        HashtagBucket.objects.bulk_create(
+            (HashtagBucket(**row) for row in buckets.iterator()), batch_size=batch_size,
+        )
+        mentions = (
+            CommentHashtag.objects.values('hashtag_id', car_id=F('comment__car_id'))
+            .annotate(count=Count('pk')).order_by()
+        )
+        CarHashtag.objects.bulk_create(
+            (CarHashtag(**row) for row in mentions.iterator()), batch_size=batch_size,
+        )
+        transaction.on_commit(bump_catalog_version)
+
+
+def trending(window=TRENDING_WINDOW, limit=TRENDING_LIMIT):
+    """
+    The most mentioned hashtags of the last ``window``, as dicts with
+    ``name`` and ``mentions``.
+    """
+    since = hour_of(timezone.now() - window)
+    return list(
+        HashtagBucket.objects.filter(bucket__gte=since)
+        .values('hashtag_id')
+        .annotate(name=F('hashtag__name'), mentions=Sum('count'))
+        .filter(mentions__gt=0)
+        .order_by('-mentions', 'name')
+        .values('name', 'mentions')[:limit]
+    )
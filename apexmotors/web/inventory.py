@@ -0,0 +1,38 @@
+"""
+Seller inventory figures for the profile page.
+
+Everything comes from one conditional aggregate over the seller's cars, so
+the cost does not grow with the number of rows sent to the template.
+"""
+from django.db.models import Avg, Count, Q, Sum
+
+from .models import Car
+
+
+def inventory_summary(queryset):
+    """
+    Count, total and average price and a per-category breakdown of
+    ``queryset`` in a single query.
+    """
+    choices = Car._meta.get_field('category').choices
+    aggregates = {
+        f'category_{index}': Count('pk', filter=Q(category=value))
+        for index, (value, _label) in enumerate(choices)
+    }
+    totals = queryset.aggregate(
+        count=Count('pk'),
+        total_price=Sum('price'),
+        average_price=Avg('price'),
+        **aggregates,
+    )
+    categories = [
+        {'value': value, 'label': label, 'count': totals[f'category_{index}']}
+        for index, (value, label) in enumerate(choices)
+        if totals[f'category_{index}']
+    ]
+    return {
+        'count': totals['count'],
+        'total_price': totals['total_price'] or 0,
+        'average_price': round(totals['average_price'] or 0),
+        'categories': categories,
+    }
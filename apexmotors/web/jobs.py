@@ -0,0 +1,158 @@
+"""
+PostgreSQL backed job queue.
+
+Jobs are rows in web_job. Workers (`manage.py worker`) claim them with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can poll the same
+table without blocking each other or running a job twice. A claimed job
+holds a lease; if its worker dies the lease expires and another worker picks
+it up. Failures are retried with exponential backoff up to max_attempts.
+
+Tasks are plain functions registered with @task (see web.tasks) and are
+enqueued by name with JSON serializable keyword arguments:
+
+    jobs.enqueue('render_car_image', car_image_id=image.pk)
+
+Enqueueing inside a transaction is atomic with the surrounding writes, the
+job only becomes visible to workers once the transaction commits.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+LEASE = timedelta(minutes=5)
+RETRY_BACKOFF = timedelta(seconds=10)
+KEEP_FINISHED = timedelta(days=7)
+
+
+def task(func):
+    TASKS[func.__name__] = func
+    return func
+
+
+def enqueue(name, run_at=None, max_attempts=5, **payload):
+    if name not in TASKS:
+        raise KeyError(f"Unknown task {name!r}")
+    return Job.objects.create(
+        task=name,
+        payload=payload,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def enqueue_many(name, payloads, max_attempts=5):
+    """
+    Enqueue one ``name`` job per payload dict with a single INSERT.
+    """
+    if name not in TASKS:
+        raise KeyError(f"Unknown task {name!r}")
+    now = timezone.now()
+    return Job.objects.bulk_create([
+        Job(task=name, payload=payload, run_at=now, max_attempts=max_attempts)
+        for payload in payloads
+    ])
+
+
+def claim():
+    """
+    Lock and return the next due job, or None when the queue is idle.
+    """
+    now = timezone.now()
+    due = Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('run_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.locked_until = now + LEASE
+        job.save(update_fields=['status', 'attempts', 'started_at', 'locked_until'])
+    return job
+
+
+def run(job):
+    """
+    Execute a claimed job and record the outcome.
+    """
+    try:
+        TASKS[job.task](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            logger.error("Job %s failed permanently", job)
+        else:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            logger.warning("Job %s failed, retrying at %s", job, job.run_at)
+    else:
+        job.status = Job.DONE
+    job.finished_at = timezone.now()
+    job.locked_until = None
+    job.save(update_fields=['status', 'run_at', 'last_error', 'finished_at', 'locked_until'])
+    return job.status
+
+
+def run_next():
+    """
+    Claim and run one job. Returns the job, or None when nothing was due.
+    """
+    job = claim()
+    if job is not None:
+        run(job)
+    return job
+
+
+def prune(older_than=KEEP_FINISHED):
+    """
+    Delete finished jobs so the table stays small. Failed jobs are kept for
+    inspection in the admin.
+    """
+    cutoff = timezone.now() - older_than
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def stats(window=timedelta(minutes=15)):
+    """
+    Queue depth and latency figures for monitoring.
+    """
+    now = timezone.now()
+    pending = Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING]).aggregate(
+        queued=Count('pk', filter=Q(status=Job.QUEUED)),
+        due=Count('pk', filter=Q(status=Job.QUEUED, run_at__lte=now)),
+        running=Count('pk', filter=Q(status=Job.RUNNING)),
+        oldest_due=Min('run_at', filter=Q(status=Job.QUEUED, run_at__lte=now)),
+    )
+    recent = Job.objects.filter(finished_at__gte=now - window).aggregate(
+        done=Count('pk', filter=Q(status=Job.DONE)),
+        failed=Count('pk', filter=Q(status=Job.FAILED)),
+        wait=Avg(F('started_at') - F('run_at'), filter=Q(status=Job.DONE)),
+        runtime=Avg(F('finished_at') - F('started_at'), filter=Q(status=Job.DONE)),
+    )
+    oldest_due = pending.pop('oldest_due')
+    return {
+        **pending,
+        'oldest_due_age_seconds': (now - oldest_due).total_seconds() if oldest_due else 0.0,
+        'window_seconds': window.total_seconds(),
+        'done': recent['done'],
+        'failed': recent['failed'],
+        'avg_wait_seconds': recent['wait'].total_seconds() if recent['wait'] else 0.0,
+        'avg_runtime_seconds': recent['runtime'].total_seconds() if recent['runtime'] else 0.0,
+    }
@@ -0,0 +1,49 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+# Written to STATIC_ROOT after a successful collectstatic
+HASH_FILE = '.source-hash'
+
+
+def source_hash():
+    """
+    Hash of the name and content of every file collectstatic would copy,
+    from STATICFILES_DIRS and installed apps alike, and of the bundle layout.
+    """
+    digest = hashlib.sha256(repr(sorted(settings.STATIC_BUNDLES.items())).encode())
+    found = []
+    for finder in get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            found.append((getattr(storage, 'prefix', None) or '', path, storage))
+    for prefix, path, storage in sorted(found, key=lambda item: item[:2]):
+        digest.update(os.path.join(prefix, path).encode())
+        with storage.open(path) as source:
+            for chunk in iter(lambda: source.read(1 << 16), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = "Run collectstatic only when the static sources changed since the last run."
+
+    def handle(self, *args, **options):
+        hash_path = os.path.join(settings.STATIC_ROOT, HASH_FILE)
+        current = source_hash()
+        try:
+            with open(hash_path) as stored:
+                previous = stored.read().strip()
+        except FileNotFoundError:
+            previous = None
+
+        if current == previous:
+            self.stdout.write("Static files unchanged, skipping collectstatic.")
+            return
+
+        call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+        with open(hash_path, 'w') as stored:
+            stored.write(current)
@@ -0,0 +1,41 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from web.export import CONTENT_TYPES, export_lines
+from web.forms import CarSearchForm
+
+
+class Command(BaseCommand):
+    help = "Export cars as CSV or JSON Lines, gzip compressed when the output ends in .gz."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write, e.g. cars.csv.gz.")
+        parser.add_argument('--format', choices=list(CONTENT_TYPES),
+                            help="Guessed from the output name by default.")
+        parser.add_argument('--filter', default='',
+                            help="Catalog filters as a query string, e.g. 'brand=BMW&year_min=2020'.")
+        parser.add_argument('--base-url', default='',
+                            help="Prefix for image URLs, e.g. https://apexmotors.com.")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('jsonl' if '.jsonl' in output else 'csv')
+        form = CarSearchForm(QueryDict(options['filter']))
+        if not form.is_valid():
+            raise CommandError(f"Invalid filter: {form.errors.as_text()}")
+
+        opener = gzip.open if output.endswith('.gz') else open
+        started = time.monotonic()
+        rows = 0
+        with opener(output, 'wt', encoding='utf-8', newline='') as out:
+            for line in export_lines(form.cleaned_data, fmt, base_url=options['base_url'].rstrip('/')):
+                out.write(line)
+                rows += 1
+
+        if fmt == 'csv':
+            rows -= 1  # header
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Exported {rows} cars to {output} in {elapsed:.1f}s."))
@@ -0,0 +1,207 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from web import counters, jobs
+from web.cache import bump_car_version, bump_catalog_version
+from web.forms import CarForm
+from web.models import Car, CarImage
+from web.signals import first_image_subquery
+
+# Columns taken from the feed, the same fields sellers fill in on the site
+IMPORT_FIELDS = [name for name in CarForm.Meta.fields if name != 'document']
+
+# Fields filled in by the import itself rather than validated from the feed
+SKIP_VALIDATION = ['owner', 'document', 'cover', 'search_vector', 'stock_number']
+
+
+def read_rows(path, fmt):
+    """
+    Yield (line number, dict) pairs from a CSV or JSONL file without loading
+    it whole.
+    """
+    with open(path, newline='', encoding='utf-8') as feed:
+        if fmt == 'csv':
+            reader = csv.DictReader(feed)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(feed, start=1):
+                if line.strip():
+                    yield number, json.loads(line)
+
+
+def split_list(value):
+    # CSV feeds list colors and images as "Red|Blue"
+    if isinstance(value, str):
+        return [item.strip() for item in value.split('|') if item.strip()]
+    return list(value or [])
+
+
+class Command(BaseCommand):
+    help = (
+        "Import listings for one dealer from a CSV or JSONL feed. Rows are upserted on "
+        "the dealer's stock_number, so an interrupted import can simply be run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or JSONL file.")
+        parser.add_argument('--owner', required=True, help="Username of the dealer the listings belong to.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Feed format, guessed from the file extension by default.")
+        parser.add_argument('--images-dir',
+                            help="Directory the 'images' column is relative to. Images are skipped without it.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=8, help="Threads copying image files.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.json')) else 'csv')
+        try:
+            self.owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['owner']!r}")
+        self.images_dir = options['images_dir']
+        self.pool = ThreadPoolExecutor(max_workers=options['workers'])
+
+        started = time.monotonic()
+        imported = rejected = images = 0
+        # Keyed on stock number, a feed repeating one within a batch keeps
+        # its last row (ON CONFLICT cannot update a row twice in one statement)
+        batch = {}
+        try:
+            for number, row in read_rows(options['path'], fmt):
+                car = self.build(number, row)
+                if car is None:
+                    rejected += 1
+                    continue
+                batch[car.stock_number] = car
+                if len(batch) >= options['batch_size']:
+                    images += self.write(list(batch.values()))
+                    imported += len(batch)
+                    batch = {}
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f"{imported} cars imported ({imported / elapsed:.0f}/s), {rejected} rejected")
+            if batch:
+                images += self.write(list(batch.values()))
+                imported += len(batch)
+        finally:
+            self.pool.shutdown()
+            bump_catalog_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} cars and {images} images in {elapsed:.1f}s "
+            f"({imported / elapsed if elapsed else 0:.0f} cars/s), {rejected} rows rejected."
+        ))
+
+    def build(self, number, row):
+        """
+        Validate one feed row and return an unsaved Car, or None after
+        reporting why the row was rejected.
+        """
+        stock_number = str(row.get('stock_number') or '').strip()
+        if not stock_number:
+            self.stderr.write(f"Line {number}: missing stock_number")
+            return None
+
+        values = {name: row[name] for name in IMPORT_FIELDS if row.get(name) not in (None, '')}
+        if 'available_colors' in values:
+            values['available_colors'] = split_list(values['available_colors'])
+        car = Car(owner=self.owner, stock_number=stock_number, **values)
+        try:
+            car.full_clean(exclude=SKIP_VALIDATION, validate_unique=False)
+        except ValidationError as exc:
+            self.stderr.write(f"Line {number} ({stock_number}): {exc.message_dict}")
+            return None
+        car.image_names = split_list(row.get('images'))
+        return car
+
+    def write(self, cars):
+        """
+        Upsert one batch of cars and attach their images. Returns the number
+        of images added.
+        """
+        with transaction.atomic():
+            Car.objects.bulk_create(
+                cars,
+                update_conflicts=True,
+                unique_fields=['owner', 'stock_number'],
+                update_fields=IMPORT_FIELDS + ['updated_at'],
+            )
+            # Upserted rows do not get their primary keys back
+            ids = dict(
+                Car.objects.filter(owner=self.owner, stock_number__in=[car.stock_number for car in cars])
+                .values_list('stock_number', 'pk')
+            )
+            # bulk_create sends no signals, detail page fragments of updated
+            # cars would stay cached
+            transaction.on_commit(partial(bump_car_version, *ids.values()))
+        if not self.images_dir:
+            return 0
+
+        # Files are copied outside any transaction, and removed again if the
+        # rows pointing at them are rolled back
+        wanted, copied, written = self.copy_images(cars, ids)
+        try:
+            with transaction.atomic():
+                new_images = self.attach_images(wanted, copied, ids)
+        except Exception:
+            for path in written:
+                default_storage.delete(path)
+            raise
+        if new_images:
+            jobs.enqueue_many('render_car_image', [{'car_image_id': image.pk} for image in new_images])
+        return len(new_images)
+
+    def copy_images(self, cars, ids):
+        """
+        Copy the batch's images that have no CarImage yet into storage.
+        Returns the car id for every image path, the paths now in storage
+        and the paths this call wrote.
+        """
+        wanted = {}
+        for car in cars:
+            for name in car.image_names:
+                # Predictable paths so a re-run finds the files it already copied
+                path = f"car_images/import/{self.owner.pk}/{car.stock_number}/{os.path.basename(name)}"
+                wanted[path] = (ids[car.stock_number], name)
+
+        existing = set(CarImage.objects.filter(image__in=wanted).values_list('image', flat=True))
+        missing = [path for path in wanted if path not in existing]
+
+        copied, written = [], []
+        for path, error, new in self.pool.map(self.copy_image, missing, [wanted[path][1] for path in missing]):
+            if error:
+                self.stderr.write(f"{path}: {error}")
+                continue
+            copied.append(path)
+            if new:
+                written.append(path)
+        return {path: car_id for path, (car_id, _name) in wanted.items()}, copied, written
+
+    def attach_images(self, wanted, copied, ids):
+        new_images = CarImage.objects.bulk_create([CarImage(car_id=wanted[path], image=path) for path in copied])
+        Car.objects.filter(pk__in=ids.values(), cover__isnull=True).update(cover=first_image_subquery())
+        # bulk_create sends no signals
+        counters.recount(list(ids.values()))
+        return new_images
+
+    def copy_image(self, path, name):
+        try:
+            if default_storage.exists(path):
+                return path, None, False
+            with open(os.path.join(self.images_dir, name), 'rb') as source:
+                default_storage.save(path, File(source))
+        except OSError as exc:
+            return path, exc, False
+        return path, None, True
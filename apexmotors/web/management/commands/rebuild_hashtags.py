@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from web.hashtags import extract, hour_of, rebuild_counts
+from web.models import Comment, CommentHashtag, Hashtag
+
+
+class Command(BaseCommand):
+    help = "Relink comment hashtags from their text and rebuild the trending and per-car counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        last_id = 0
+        linked = 0
+        while True:
+            comments = list(
+                Comment.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'text', 'created_at')[:batch_size]
+            )
+            if not comments:
+                break
+
+            names = {pk: extract(text) for pk, text, _created_at in comments}
+            buckets = {pk: hour_of(created_at) for pk, _text, created_at in comments}
+            wanted = {name for tags in names.values() for name in tags}
+            with transaction.atomic():
+                Hashtag.objects.bulk_create([Hashtag(name=name) for name in wanted], ignore_conflicts=True)
+                ids = dict(Hashtag.objects.filter(name__in=wanted).values_list('name', 'pk'))
+                pairs = {(pk, ids[name]) for pk, tags in names.items() for name in tags}
+                # Links that are still right keep the hour they are counted
+                # in, missing ones count in the hour the comment was written
+                existing = {
+                    (comment_id, hashtag_id): pk
+                    for pk, comment_id, hashtag_id in CommentHashtag.objects.filter(comment_id__in=names)
+                    .values_list('pk', 'comment_id', 'hashtag_id')
+                }
+                CommentHashtag.objects.filter(comment_id__in=names).exclude(
+                    pk__in=[pk for pair, pk in existing.items() if pair in pairs],
+                ).delete()
+                CommentHashtag.objects.bulk_create([
+                    CommentHashtag(comment_id=comment_id, hashtag_id=hashtag_id, bucket=buckets[comment_id])
+                    for comment_id, hashtag_id in pairs - existing.keys()
+                ])
+            linked += len(pairs)
+            last_id = comments[-1][0]
+            self.stdout.write(f"Linked {linked} hashtags (last comment id {last_id})")
+
+        rebuild_counts(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Done, {linked} hashtag links counted."))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from web.models import Car
+
+
+class Command(BaseCommand):
+    help = "Fill Car.search_vector for existing rows in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true',
+                            help="Rebuild every row, not only rows without a search vector.")
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Seconds to pause between batches to limit load.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Car.objects.all() if options['all'] else Car.objects.filter(search_vector__isnull=True)
+
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                queryset.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            # Rewriting brand fires the web_car_search_vector trigger, so the
+            # document is built by the same SQL as regular saves. Each batch is
+            # its own short transaction and only row locks are taken.
+            with transaction.atomic():
+                updated += Car.objects.filter(pk__in=ids).update(brand=F('brand'))
+
+            last_id = ids[-1]
+            self.stdout.write(f"Indexed {updated} cars (last id {last_id})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {updated} cars indexed."))
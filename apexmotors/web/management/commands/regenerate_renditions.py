@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from web.models import CarImage
+from web.renditions import mark_rendered, render_file
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail, card and detail renditions for CarImage files in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--all', action='store_true',
+                            help="Regenerate every image, not only images without current renditions.")
+
+    def handle(self, *args, **options):
+        queryset = CarImage.objects.exclude(image='')
+        if not options['all']:
+            queryset = queryset.exclude(renditions_for=F('image'))
+        # Duplicated listings share files, render each file once
+        images = sorted(set(queryset.values_list('image', flat=True)))
+        if not images:
+            self.stdout.write("Nothing to do.")
+            return
+
+        # Spawned rather than forked so workers never share this process's
+        # database connection; they only read and write media files.
+        context = multiprocessing.get_context('spawn')
+
+        started = time.monotonic()
+        done = failed = 0
+        with ProcessPoolExecutor(options['workers'], mp_context=context, initializer=django.setup) as pool:
+            futures = {pool.submit(render_file, name): name for name in images}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{name}: {exc}")
+                    continue
+                mark_rendered(name)
+                done += 1
+                if done % 100 == 0:
+                    self.stdout.write(f"{done}/{len(images)} images rendered")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {done} images in {elapsed:.1f}s ({done / elapsed:.1f}/s), {failed} failed."
+        ))
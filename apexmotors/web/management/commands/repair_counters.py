@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from web.counters import recount
+from web.models import Car
+
+
+class Command(BaseCommand):
+    help = "Recompute Car.image_count, comment_count and purchase_count in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Seconds to pause between batches to limit load.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        last_id = 0
+        checked = repaired = 0
+        while True:
+            ids = list(
+                Car.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            # One short transaction per batch, only the drifted rows are locked
+            with transaction.atomic():
+                repaired += len(recount(ids))
+
+            checked += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Checked {checked} cars, repaired {repaired} (last id {last_id})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {repaired} of {checked} cars repaired."))
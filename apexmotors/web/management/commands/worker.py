@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from web import jobs
+
+PRUNE_INTERVAL = 3600  # seconds between clean ups of finished jobs while idle
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the web_job queue until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="Seconds to wait before polling an empty queue again.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit as soon as no job is due.")
+        parser.add_argument('--max-jobs', type=int, default=0,
+                            help="Exit after this many jobs so a supervisor can recycle the process.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        processed = 0
+        last_prune = 0.0
+        self.stdout.write("Worker started.")
+        while not self.stopping:
+            close_old_connections()
+            job = jobs.run_next()
+            if job is None:
+                if options['burst']:
+                    break
+                if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                    jobs.prune()
+                    last_prune = time.monotonic()
+                time.sleep(options['sleep'])
+                continue
+
+            processed += 1
+            self.stdout.write(f"{job.task} #{job.pk}: {job.status} (attempt {job.attempts})")
+            if options['max_jobs'] and processed >= options['max_jobs']:
+                break
+
+        self.stdout.write(f"Worker stopped after {processed} jobs.")
+
+    def stop(self, signum, frame):
+        # Let the current job finish, then leave the loop
+        self.stopping = True
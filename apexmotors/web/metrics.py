@@ -0,0 +1,343 @@
+"""
+Prometheus metrics for views, the database and the cache.
+
+MetricsMiddleware counts requests and records latency, response size and
+queries per request by URL name, plus the duration of every SQL statement.
+Cache lookups are counted as hits or misses by kind of key (page, fragment,
+version). Everything is kept in a plain in-process Registry; recording is a
+few dict updates under a lock.
+
+Gunicorn runs several worker processes, so with METRICS_DIR set each worker
+writes its registry to METRICS_DIR/<pid>.json at most every
+METRICS_FLUSH_INTERVAL seconds from a background thread, and when it exits.
+/metrics/ sums all those files, so whichever worker answers the scrape
+reports the whole container. When gunicorn reaps a worker its file is folded
+into archive.json, which keeps counters monotonic across worker restarts.
+METRICS_DIR should be on tmpfs (/dev/shm) and is emptied when gunicorn
+starts; see gunicorn.conf.py.
+Without METRICS_DIR, e.g. under runserver, /metrics/ reports this process.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+ARCHIVE = 'archive.json'
+# Tokens of archived worker files remembered in the archive, see collect()
+ARCHIVED_TOKENS = 100
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'apexmotors_http_requests_total': (
+        'counter', 'HTTP requests by URL name, method and status.', None),
+    'apexmotors_http_request_duration_seconds': (
+        'histogram', 'Time spent serving a request, by URL name.', DURATION_BUCKETS),
+    'apexmotors_http_response_size_bytes': (
+        'histogram', 'Size of non-streaming response bodies, by URL name.', SIZE_BUCKETS),
+    'apexmotors_db_queries_per_request': (
+        'histogram', 'SQL statements run by one request, by URL name.', QUERY_COUNT_BUCKETS),
+    'apexmotors_db_query_duration_seconds': (
+        'histogram', 'Duration of single SQL statements.', QUERY_DURATION_BUCKETS),
+    'apexmotors_cache_requests_total': (
+        'counter', 'Cache lookups by kind of key and result (hit or miss).', None),
+}
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# First segment of a cache key -> kind label, see web.cache and {% cache %}
+CACHE_KEY_KINDS = {
+    'page': 'page', 'template': 'fragment', 'facets': 'fragment',
+    'car': 'version', 'catalog': 'version', 'counter': 'version', 'hashtag': 'version',
+}
+_KEY_PREFIX = re.compile(r'[:.]')
+
+
+class Registry:
+    """
+    Counter values and histogram bucket counts keyed by (name, labels),
+    where labels is a tuple of (label, value) pairs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        # Bumped on every update, tells the flusher whether to write
+        self.changes = 0
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self.changes += 1
+
+    def observe(self, name, labels=(), *values):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            # One count per bucket (not cumulative) plus +Inf, then the sum
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(buckets) + 2)
+            for value in values:
+                entry[bisect_left(buckets, value)] += 1
+                entry[-1] += value
+            self.changes += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [name, list(labels), list(value) if isinstance(value, list) else value]
+                for (name, labels), value in self.values.items()
+            ]
+
+
+registry = Registry()
+
+
+def merge(rows, into):
+    for name, labels, value in rows:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if isinstance(value, list):
+            current = into.setdefault(key, [0] * len(value))
+            for index, count in enumerate(value):
+                current[index] += count
+        else:
+            into[key] = into.get(key, 0) + value
+    return into
+
+
+def write_json(path, data):
+    # Readers never see a half written file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(data, output)
+    os.replace(temporary, path)
+
+
+def read_json(path, default=None):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return default
+
+
+_flush_lock = threading.Lock()
+_flusher_pid = None
+_token = (None, None)
+
+
+def process_token():
+    """
+    Identifies this process's file, unlike the pid it is never reused.
+    """
+    global _token
+    if _token[0] != os.getpid():
+        # Workers are forked from the master, each needs its own
+        _token = (os.getpid(), uuid.uuid4().hex)
+    return _token[1]
+
+
+def flush(directory=None):
+    """
+    Write this process's registry to ``directory``.
+    """
+    directory = directory or settings.METRICS_DIR
+    if not directory:
+        return
+    with _flush_lock:
+        os.makedirs(directory, exist_ok=True)
+        write_json(
+            os.path.join(directory, f'{os.getpid()}.json'),
+            {'token': process_token(), 'values': registry.snapshot()},
+        )
+
+
+def flush_periodically(directory, interval):
+    written = None
+    while True:
+        time.sleep(interval)
+        if registry.changes != written:
+            written = registry.changes
+            flush(directory)
+
+
+def start_flusher():
+    """
+    Flush from a daemon thread every METRICS_FLUSH_INTERVAL, so requests
+    never wait on the file. Threads do not survive fork, so this runs once
+    per worker, on its first request.
+    """
+    global _flusher_pid
+    if not settings.METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(
+        target=flush_periodically, args=(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL),
+        name='metrics-flush', daemon=True,
+    ).start()
+
+
+def collect(directory=None):
+    """
+    Sum the registries of every process, or return this process's alone
+    when no METRICS_DIR is configured.
+    """
+    directory = directory or settings.METRICS_DIR
+    if not directory:
+        return merge(registry.snapshot(), {})
+    flush(directory)
+    # Worker files first, then the archive. A worker archived in between is
+    # either still in the files read or already in the archive, and the
+    # tokens the archive lists tell which files it already holds.
+    workers = []
+    for filename in os.listdir(directory):
+        stem, extension = os.path.splitext(filename)
+        if extension == '.json' and stem.isdigit():
+            data = read_json(os.path.join(directory, filename))
+            if data is not None:
+                workers.append(data)
+    archive = read_json(os.path.join(directory, ARCHIVE), {'merged': [], 'values': []})
+    values = merge(archive['values'], {})
+    merged = set(archive['merged'])
+    for data in workers:
+        if data['token'] not in merged:
+            merge(data['values'], values)
+    return values
+
+
+def archive_process(directory, pid):
+    """
+    Fold the file of the exited worker ``pid`` into the archive. Only the
+    gunicorn master calls this, so the archive has a single writer.
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    data = read_json(path)
+    if data is None:
+        return
+    archive_path = os.path.join(directory, ARCHIVE)
+    archive = read_json(archive_path, {'merged': [], 'values': []})
+    values = merge(archive['values'], merge(data['values'], {}))
+    values = [[name, list(labels), value] for (name, labels), value in values.items()]
+    # Tokens are unique, unlike pids, so they can stay listed while scrapes
+    # that read the worker file before it was unlinked finish
+    merged = (archive['merged'] + [data['token']])[-ARCHIVED_TOKENS:]
+    write_json(archive_path, {'merged': merged, 'values': values})
+    os.unlink(path)
+
+
+def reset(directory):
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        os.unlink(os.path.join(directory, filename))
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def exposition(values):
+    """
+    Render collected ``values`` in the Prometheus text format.
+    """
+    by_name = {}
+    for (name, labels), value in sorted(values.items()):
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in by_name.get(name, []):
+            if kind == 'counter':
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {value[-1]}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+_MISSING = object()
+
+
+def counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, _MISSING, version)
+        hit = value is not _MISSING
+        kind = CACHE_KEY_KINDS.get(_KEY_PREFIX.split(str(key), 1)[0], 'other')
+        registry.inc('apexmotors_cache_requests_total', (('kind', kind), ('result', 'hit' if hit else 'miss')))
+        return value if hit else default
+    wrapper.counted = True
+    return wrapper
+
+
+class QueryTimer:
+    __slots__ = ('durations',)
+
+    def __init__(self):
+        self.durations = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations.append(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Count hits and misses on every backend class in use
+        from django.core.cache import caches
+        for alias in settings.CACHES:
+            backend = type(caches[alias])
+            if not getattr(backend.get, 'counted', False):
+                backend.get = counted_get(backend.get)
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connections['default'].execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.view_name or 'unnamed') if match else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        labels = (('view', view),)
+        registry.inc('apexmotors_http_requests_total', (*labels, ('method', method), ('status', str(response.status_code))))
+        registry.observe('apexmotors_http_request_duration_seconds', labels, elapsed)
+        registry.observe('apexmotors_db_queries_per_request', labels, len(timer.durations))
+        if timer.durations:
+            registry.observe('apexmotors_db_query_duration_seconds', (), *timer.durations)
+        if not response.streaming:
+            registry.observe('apexmotors_http_response_size_bytes', labels, len(response.content))
+        start_flusher()
+        return response
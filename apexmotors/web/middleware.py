@@ -0,0 +1,116 @@
+"""
+Per-request instrumentation.
+
+RequestTimingMiddleware counts and times every SQL statement through
+connection.execute_wrapper(), times template rendering, and reports both
+with the total in a Server-Timing header, e.g.
+
+    Server-Timing: sql;dur=4.1;desc="6 queries", tpl;dur=12.8, total;dur=19.5
+
+which browser devtools show under the request's Timing tab. SQL run lazily
+while a template renders is counted in both sql and tpl. Requests slower than
+SLOW_REQUEST_MS are logged to the web.timing logger as one JSON line with the
+slowest statements. With REQUEST_TIMING off the middleware removes itself
+from the stack at startup.
+"""
+import contextvars
+import heapq
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('web.timing')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'sql', 'templates', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.templates = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql += elapsed
+            self.statements.append((elapsed, sql))
+
+
+def timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timings.templates += time.perf_counter() - started
+    wrapper.timed = True
+    return wrapper
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.SLOW_REQUEST_MS / 1000
+        self.top_queries = settings.SLOW_REQUEST_TOP_QUERIES
+        # Only the outermost render() of each template is timed, {% include %}
+        # and {% extends %} render through the engine's own Template
+        if not getattr(Template.render, 'timed', False):
+            Template.render = timed_render(Template.render)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = (
+            f'sql;dur={timings.sql * 1000:.1f};desc="{timings.queries} queries", '
+            f'tpl;dur={timings.templates * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+        if total >= self.threshold:
+            self.log_slow_request(request, response, timings, total)
+        return response
+
+    def log_slow_request(self, request, response, timings, total):
+        slowest = heapq.nlargest(self.top_queries, timings.statements, key=lambda item: item[0])
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'sql_ms': round(timings.sql * 1000, 1),
+            'template_ms': round(timings.templates * 1000, 1),
+            'queries': timings.queries,
+            'slowest_queries': [
+                {'ms': round(elapsed * 1000, 2), 'sql': sql} for elapsed, sql in slowest
+            ],
+        }))
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_covers(apps, schema_editor):
+    Car = apps.get_model('web', 'Car')
+    CarImage = apps.get_model('web', 'CarImage')
+    first_image = CarImage.objects.filter(car=models.OuterRef('pk')).order_by('pk').values('pk')[:1]
+    Car.objects.filter(cover__isnull=True).update(cover=models.Subquery(first_image))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0014_userprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='cover',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='web.carimage'),
+        ),
+        migrations.RunPython(backfill_covers, migrations.RunPython.noop),
+    ]
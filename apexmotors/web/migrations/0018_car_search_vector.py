@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Model and brand rank above the spec fields, which rank above the free-form
+# description. Only fires when one of the indexed columns is written, so
+# update(price=...) style writes skip the tsvector rebuild.
+CREATE_TRIGGER = """
+CREATE FUNCTION web_car_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.brand, '') || ' ' || coalesce(NEW.model, '')), 'A') ||
+        setweight(to_tsvector('english', concat_ws(' ', NEW.category, NEW.engine, NEW.transmission,
+                                                   NEW.fuel_type, NEW.drivetrain)), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER web_car_search_vector
+    BEFORE INSERT OR UPDATE OF brand, model, category, engine, transmission, fuel_type, drivetrain, description
+    ON web_car
+    FOR EACH ROW EXECUTE FUNCTION web_car_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS web_car_search_vector ON web_car;
+DROP FUNCTION IF EXISTS web_car_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0017_car_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='car_search_vector_idx'),
+        ),
+        # Existing rows are filled in by `manage.py rebuild_search_vectors`
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0018_car_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carimage',
+            name='renditions_for',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
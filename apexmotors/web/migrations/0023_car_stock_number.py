@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0022_car_owner_year_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='stock_number',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='car',
+            constraint=models.UniqueConstraint(fields=('owner', 'stock_number'), name='car_owner_stock_number_uniq'),
+        ),
+    ]
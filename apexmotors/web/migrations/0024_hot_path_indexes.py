@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('web', '0023_car_stock_number'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_brand_year_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_category_year_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_owner_year_idx',
+        ),
+        migrations.AlterField(
+            model_name='car',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cars', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='car',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='web.car'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['brand', 'year', 'id'], name='car_brand_year_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['category', 'year', 'id'], name='car_category_year_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['brand', 'category', 'fuel_type', 'transmission', 'drivetrain', 'new_or_used'], include=('year', 'price', 'mileage'), name='car_facets_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['owner', 'year', 'id'], include=('price', 'category'), name='car_owner_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['car', 'created_at'], name='comment_car_created_idx'),
+        ),
+    ]
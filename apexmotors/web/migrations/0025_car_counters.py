@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:31
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Car = apps.get_model('web', 'Car')
+    counts = {}
+    for field, model_name in [('image_count', 'CarImage'), ('comment_count', 'Comment'), ('purchase_count', 'Purchase')]:
+        model = apps.get_model('web', model_name)
+        total = (
+            model.objects.filter(car=models.OuterRef('pk')).order_by()
+            .values('car').annotate(total=models.Count('pk')).values('total')
+        )
+        counts[field] = Coalesce(models.Subquery(total, output_field=models.IntegerField()), 0)
+    Car.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0024_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='purchase_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['image_count', 'id'], name='car_image_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['comment_count', 'id'], name='car_comment_count_id_idx'),
+        ),
+    ]
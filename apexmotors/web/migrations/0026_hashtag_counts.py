@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:34
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import TruncHour
+import django.db.models.deletion
+
+
+def fill_link_buckets(apps, schema_editor):
+    # Existing mentions count in the hour their comment was written
+    Comment = apps.get_model('web', 'Comment')
+    CommentHashtag = apps.get_model('web', 'CommentHashtag')
+    CommentHashtag.objects.update(bucket=Subquery(
+        Comment.objects.filter(pk=OuterRef('comment_id')).values(hour=TruncHour('created_at'))[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0025_car_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarHashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('car', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='hashtag_mentions', to='web.car')),
+                ('hashtag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='car_mentions', to='web.hashtag')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HashtagBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='web.hashtag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket'], include=('hashtag', 'count'), name='hashtag_bucket_trending_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hashtagbucket',
+            constraint=models.UniqueConstraint(fields=('hashtag', 'bucket'), name='hashtag_bucket_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='carhashtag',
+            index=models.Index(fields=['hashtag', 'count', 'car'], name='car_hashtag_count_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='carhashtag',
+            constraint=models.UniqueConstraint(fields=('car', 'hashtag'), name='car_hashtag_uniq'),
+        ),
+        # Give Comment.hashtags a through model on its existing table
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='CommentHashtag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('comment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='web.comment')),
+                        ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='web.hashtag')),
+                    ],
+                    options={
+                        'db_table': 'web_comment_hashtags',
+                        'unique_together': {('comment', 'hashtag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='comment',
+                    name='hashtags',
+                    field=models.ManyToManyField(blank=True, through='web.CommentHashtag', to='web.hashtag'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='commenthashtag',
+            name='bucket',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_link_buckets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='commenthashtag',
+            name='bucket',
+            field=models.DateTimeField(),
+        ),
+    ]
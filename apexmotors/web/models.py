@@ -1,7 +1,14 @@
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from multiselectfield import MultiSelectField
 
+# Shown for cars without any CarImage, relative to MEDIA_ROOT
+DEFAULT_CAR_IMAGE = 'default/default_car.jpg'
+
 class Car(models.Model):
     BRAND_CHOICES = [
         ('Aston Martin', 'Aston Martin'),
@@ -96,11 +103,67 @@ class Car(models.Model):
     transmission = models.CharField(max_length=50, choices=TRANMISSION_TYPE, default='Other')
     top_speed = models.IntegerField(default=0)
     acceleration = models.FloatField(default=0.0)  # 0-100 km/h in seconds
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cars', null=True, blank=True)
+    # Indexed by car_owner_year_idx, which leads with owner
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cars', null=True, blank=True, db_index=False)
 
     document = models.FileField(upload_to='documents/', null=True, blank=True)
 
-    
+    # Dealer's own identifier for the listing, the upsert key of import_cars.
+    # NULL for cars added by hand, so they never collide.
+    stock_number = models.CharField(max_length=64, null=True, blank=True)
+
+    # Denormalized cover image so listing pages can select_related() it
+    # instead of hitting car.images once per card. Maintained by web.signals.
+    cover = models.ForeignKey('CarImage', on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+
+    # Weighted full-text document, filled in by the web_car_search_vector
+    # database trigger (see migration 0018) so bulk writes stay indexed too.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Last change to the car, its images or its comments (see web.signals),
+    # used to answer conditional GETs
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Number of related rows, kept up to date by web.signals (see web.counters)
+    image_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    purchase_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination over (year, id) and year range filters
+            models.Index(fields=['year', 'id'], name='car_year_id_idx'),
+            # Range filters
+            models.Index(fields=['price'], name='car_price_idx'),
+            models.Index(fields=['mileage'], name='car_mileage_idx'),
+            # Facet filters with the catalog's (year, id) keyset ordering
+            models.Index(fields=['brand', 'year', 'id'], name='car_brand_year_id_idx'),
+            models.Index(fields=['category', 'year', 'id'], name='car_category_year_id_idx'),
+            # Covers every column facet_counts() reads, so the per-facet
+            # counts come from an index-only scan instead of the wide heap
+            models.Index(
+                fields=['brand', 'category', 'fuel_type', 'transmission', 'drivetrain', 'new_or_used'],
+                include=['year', 'price', 'mileage'],
+                name='car_facets_idx',
+            ),
+            # Substring search, icontains compiles to UPPER(col) LIKE UPPER(%s)
+            GinIndex(OpClass(Upper('brand'), name='gin_trgm_ops'), name='car_brand_trgm_idx'),
+            GinIndex(OpClass(Upper('model'), name='gin_trgm_ops'), name='car_model_trgm_idx'),
+            GinIndex(OpClass(Upper('category'), name='gin_trgm_ops'), name='car_category_trgm_idx'),
+            # Full-text search
+            GinIndex(fields=['search_vector'], name='car_search_vector_idx'),
+            # A seller's listings newest first, for profiles and their
+            # pagination, covering the inventory_summary() aggregate too
+            models.Index(fields=['owner', 'year', 'id'], include=['price', 'category'], name='car_owner_year_idx'),
+            # Max(updated_at) for listing ETags
+            models.Index(fields=['updated_at'], name='car_updated_at_idx'),
+            # Catalog "most photos" and "most discussed" keyset orderings
+            models.Index(fields=['image_count', 'id'], name='car_image_count_id_idx'),
+            models.Index(fields=['comment_count', 'id'], name='car_comment_count_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'stock_number'], name='car_owner_stock_number_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.brand} {self.model}"
@@ -108,10 +171,16 @@ class Car(models.Model):
 class CarImage(models.Model):
     car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='car_images/', default='defaults/default_car_image.jpg')
+    # Name of the original the files under renditions/ were generated from
+    renditions_for = models.CharField(max_length=255, blank=True, editable=False)
 
     def __str__(self):
         return f"Image for {self.car.brand} {self.car.model}"
 
+    @property
+    def has_renditions(self):
+        return bool(self.image.name) and self.renditions_for == self.image.name
+
 class Hashtag(models.Model):
     name = models.CharField(max_length=50, unique=True)
 
@@ -119,13 +188,78 @@ class Hashtag(models.Model):
         return f"#{self.name}"
 
 
+class HashtagBucket(models.Model):
+    """
+    Mentions of a hashtag in comments written during one hour, summed over
+    recent buckets for the trending list. Maintained by web.hashtags.
+    """
+    # Indexed by hashtag_bucket_uniq, which leads with hashtag
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='buckets', db_index=False)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hashtag', 'bucket'], name='hashtag_bucket_uniq'),
+        ]
+        indexes = [
+            # Trending: sum the counts of the latest buckets from the index alone
+            models.Index(fields=['bucket'], include=['hashtag', 'count'], name='hashtag_bucket_trending_idx'),
+        ]
+
+
+class CarHashtag(models.Model):
+    """
+    How often a hashtag is mentioned in a car's comments, for the "cars
+    tagged #x" listing. Maintained by web.hashtags.
+    """
+    # Indexed by car_hashtag_uniq, which leads with car
+    car = models.ForeignKey('Car', on_delete=models.CASCADE, related_name='hashtag_mentions', db_index=False)
+    # Indexed by car_hashtag_count_idx, which leads with hashtag
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='car_mentions', db_index=False)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['car', 'hashtag'], name='car_hashtag_uniq'),
+        ]
+        indexes = [
+            # A tag's cars, most mentioned first, keyset paginated on (count, car)
+            models.Index(fields=['hashtag', 'count', 'car'], name='car_hashtag_count_idx'),
+        ]
+
+
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    car = models.ForeignKey(Car, related_name='comments', on_delete=models.CASCADE)
+    # Indexed by comment_car_created_idx, which leads with car
+    car = models.ForeignKey(Car, related_name='comments', on_delete=models.CASCADE, db_index=False)
     text = models.TextField()
-    hashtags = models.ManyToManyField('Hashtag', blank=True)
+    # Linked from the text by web.hashtags
+    hashtags = models.ManyToManyField('Hashtag', blank=True, through='CommentHashtag')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A car's comments in the order they were written
+            models.Index(fields=['car', 'created_at'], name='comment_car_created_idx'),
+        ]
+
+
+class CommentHashtag(models.Model):
+    """
+    A hashtag mentioned in a comment. Maintained by web.hashtags.
+    """
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE)
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE)
+    # The HashtagBucket hour that counts this mention: when the comment was
+    # written, or edited for tags an edit added
+    bucket = models.DateTimeField()
+
+    class Meta:
+        # The table Comment.hashtags used before it had a through model
+        db_table = 'web_comment_hashtags'
+        unique_together = [('comment', 'hashtag')]
+
 
 class Purchase(models.Model):
     car = models.ForeignKey(Car, on_delete=models.CASCADE)
@@ -140,3 +274,46 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return self.user.username
+
+
+class Job(models.Model):
+    """
+    A unit of background work, claimed by `manage.py worker` with
+    SELECT ... FOR UPDATE SKIP LOCKED. See web.jobs.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Lease of a running job, a worker that dies loses it and the job is retried
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Only pending rows are ever polled, keep the index small
+            models.Index(fields=['run_at'], name='job_pending_idx',
+                         condition=models.Q(status__in=['queued', 'running'])),
+            # Recent throughput for jobs.stats() and pruning
+            models.Index(fields=['finished_at'], name='job_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
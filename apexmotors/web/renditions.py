@@ -0,0 +1,115 @@
+"""
+Fixed-size derivatives of uploaded CarImage files.
+
+Every original is rendered once per rendition and format and stored at a
+predictable path under MEDIA_ROOT, e.g. for ``car_images/f8.png``:
+
+    renditions/card/car_images/f8.png.jpg
+    renditions/card/car_images/f8.png.webp
+
+so nginx serves them straight from the /media/ alias. The original extension
+stays in the name, so f8.png and f8.jpg never share renditions. Templates
+pick the right size with the {% rendition %} tag from
+web.templatetags.renditions.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .cache import bump_car_version, bump_catalog_version
+from .models import Car, CarImage
+
+RENDITION_ROOT = 'renditions'
+
+# name -> (width, height, crop). Cropped renditions fill the box exactly like
+# the object-fit: cover boxes they are shown in, the others keep their aspect.
+RENDITIONS = {
+    'thumb': (240, 160, True),
+    'card': (640, 400, True),
+    'detail': (1600, 1000, False),
+}
+
+# extension -> (Pillow format, save options). The first entry is the <img>
+# fallback, the rest are offered as <source> elements.
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+if features.check('avif'):
+    FORMATS['avif'] = ('AVIF', {'quality': 60})
+
+MIME_TYPES = {'jpg': 'image/jpeg', 'webp': 'image/webp', 'avif': 'image/avif'}
+
+
+def rendition_path(source_name, rendition, extension):
+    return f"{RENDITION_ROOT}/{rendition}/{source_name}.{extension}"
+
+
+def rendition_url(source_name, rendition, extension='jpg'):
+    return default_storage.url(rendition_path(source_name, rendition, extension))
+
+
+def render_file(source_name):
+    """
+    Write every rendition of ``source_name`` to storage.
+
+    Touches only files, never the database, so it is safe to run in worker
+    processes. Returns ``source_name`` for the caller's bookkeeping.
+    """
+    with default_storage.open(source_name, 'rb') as source:
+        original = Image.open(source)
+        original = ImageOps.exif_transpose(original)
+        original = original.convert('RGB')
+
+    for rendition, (width, height, crop) in RENDITIONS.items():
+        if crop:
+            image = ImageOps.fit(original, (width, height), Image.LANCZOS)
+        else:
+            image = original.copy()
+            image.thumbnail((width, height), Image.LANCZOS)
+
+        for extension, (pillow_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, pillow_format, **options)
+            path = rendition_path(source_name, rendition, extension)
+            # Keep the path predictable instead of letting storage pick a free name
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+
+    return source_name
+
+
+def delete_files(source_name):
+    for rendition in RENDITIONS:
+        for extension in FORMATS:
+            path = rendition_path(source_name, rendition, extension)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+
+
+def mark_rendered(source_name):
+    """
+    Record that the renditions of ``source_name`` exist.
+    """
+    # Copies made by the admin duplicate action point at the same file
+    images = CarImage.objects.filter(image=source_name)
+    images.update(renditions_for=source_name)
+    # update() sends no signals, invalidate cached pages by hand
+    car_ids = list(images.values_list('car_id', flat=True))
+    Car.objects.filter(pk__in=car_ids).update(updated_at=timezone.now())
+    bump_car_version(*car_ids)
+    bump_catalog_version()
+
+
+def generate(car_image):
+    """
+    Render ``car_image`` and record which original the files belong to.
+    """
+    source_name = car_image.image.name
+    render_file(source_name)
+    mark_rendered(source_name)
+    car_image.renditions_for = source_name
@@ -0,0 +1,170 @@
+"""
+Faceted catalog search.
+
+Filters are built as parameterized ORM lookups so every predicate can use the
+indexes declared on Car.Meta. Facet counts for all filter values come back
+from a single conditional aggregate query. Free text goes through the
+weighted Car.search_vector and is ranked when present. The facet counts only
+change with the catalog, so they are cached under the catalog version.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .cache import catalog_version
+from .models import Car
+
+FACET_FIELDS = ('brand', 'category', 'fuel_type', 'transmission', 'drivetrain', 'new_or_used')
+RANGE_FIELDS = ('year', 'price', 'mileage')
+TEXT_FIELDS = ('brand', 'model', 'category')
+SEARCH_CONFIG = 'english'
+
+# ts_headline does not escape HTML, so mark matches with control characters
+# and swap them for <mark> only after escaping the snippet.
+HIGHLIGHT_START, HIGHLIGHT_STOP = '\x02', '\x03'
+
+
+def search_query(query):
+    return SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+
+
+def text_filter(query):
+    # Full-text match on the GIN indexed search_vector, plus substring
+    # matches on the trigram indexes so partial words like "ferr" still hit
+    condition = Q()
+    if query:
+        condition = Q(search_vector=search_query(query))
+        for field in TEXT_FIELDS:
+            condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def range_filter(params):
+    condition = Q()
+    for field in RANGE_FIELDS:
+        low, high = params.get(f'{field}_min'), params.get(f'{field}_max')
+        if low is not None:
+            condition &= Q(**{f'{field}__gte': low})
+        if high is not None:
+            condition &= Q(**{f'{field}__lte': high})
+    return condition
+
+
+def facet_filter(params, exclude=None):
+    condition = Q()
+    for field in FACET_FIELDS:
+        values = params.get(field)
+        if field != exclude and values:
+            condition &= Q(**{f'{field}__in': values})
+    return condition
+
+
+def filter_cars(params, queryset=None):
+    """
+    Apply cleaned CarSearchForm data to ``queryset`` (all cars by default).
+    """
+    if queryset is None:
+        queryset = Car.objects.all()
+    query = params.get('q')
+    queryset = queryset.filter(text_filter(query), range_filter(params), facet_filter(params))
+    if query:
+        queryset = queryset.annotate(
+            # ts_rank() is a float4, cast so keyset cursors round-trip exactly
+            rank=Cast(SearchRank(F('search_vector'), search_query(query)), FloatField()),
+            snippet=SearchHeadline(
+                'description', search_query(query), config=SEARCH_CONFIG,
+                start_sel=HIGHLIGHT_START, stop_sel=HIGHLIGHT_STOP, max_words=30, min_words=10,
+            ),
+        )
+    return queryset
+
+
+# CarSearchForm.sort -> keyset ordering, each backed by an index on Car
+SORT_KEYS = {
+    'newest': ('year', 'id'),
+    'photos': ('image_count', 'id'),
+    'comments': ('comment_count', 'id'),
+}
+
+
+def sort_keys(params):
+    """
+    Keyset ordering for filter_cars(): the chosen sort, else by relevance
+    for text searches and newest first otherwise. The trailing id keeps the
+    order total.
+    """
+    if params.get('sort') in SORT_KEYS:
+        return SORT_KEYS[params['sort']]
+    return ('rank', 'id') if params.get('q') else ('year', 'id')
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    )
+
+
+def facet_cache_key(params):
+    # Only the filters change the counts, not the sort or the page
+    filters = [(field, params.get(field)) for field in ('q', *FACET_FIELDS)]
+    filters += [
+        (f'{field}_{bound}', params.get(f'{field}_{bound}'))
+        for field in RANGE_FIELDS for bound in ('min', 'max')
+    ]
+    filters = [(name, sorted(value) if isinstance(value, list) else value) for name, value in filters]
+    digest = hashlib.md5(repr(filters).encode()).hexdigest()
+    return f'facets:{catalog_version()}:{digest}'
+
+
+def facet_counts(params):
+    """
+    Facet counts for ``params``, from the cache while the catalog is
+    unchanged, so paging and sorting do not aggregate the table again.
+    """
+    key = facet_cache_key(params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = count_facets(params)
+        cache.set(key, facets, settings.FRAGMENT_CACHE_TIMEOUT)
+    return facets
+
+
+def count_facets(params):
+    """
+    Count matching cars for every choice of every facet in one query.
+
+    Each facet is counted against all the other active filters but not its
+    own, so selecting a brand still shows how many cars the other brands have.
+    """
+    aggregates = {}
+    for field in FACET_FIELDS:
+        others = facet_filter(params, exclude=field)
+        for index, (value, _label) in enumerate(Car._meta.get_field(field).choices):
+            # Count the (non-null) facet column itself rather than id so
+            # car_facets_idx covers the whole query
+            aggregates[f'{field}_{index}'] = Count(field, filter=Q(**{field: value}) & others)
+
+    base = Car.objects.filter(text_filter(params.get('q')), range_filter(params))
+    totals = base.aggregate(**aggregates)
+
+    facets = []
+    for field in FACET_FIELDS:
+        model_field = Car._meta.get_field(field)
+        selected = params.get(field) or []
+        options = [
+            {
+                'value': value,
+                'label': label,
+                'count': totals[f'{field}_{index}'],
+                'selected': value in selected,
+            }
+            for index, (value, label) in enumerate(model_field.choices)
+        ]
+        facets.append({'field': field, 'label': model_field.verbose_name, 'options': options})
+    return facets
@@ -0,0 +1,150 @@
+import contextvars
+from contextlib import contextmanager
+from functools import partial, wraps
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, hashtags, jobs
+from .cache import bump_car_version, bump_catalog_version
+from .models import Car, CarImage, Comment, Purchase
+
+
+_muted = contextvars.ContextVar('signals_muted', default=False)
+
+
+@contextmanager
+def muted():
+    """
+    Skip the receivers below, for bulk operations (web.bulk) that do the
+    same bookkeeping once per batch instead of once per row.
+    """
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def unless_muted(receiver_func):
+    @wraps(receiver_func)
+    def wrapper(*args, **kwargs):
+        if not _muted.get():
+            return receiver_func(*args, **kwargs)
+    return wrapper
+
+
+def after_commit(func, *args):
+    """
+    Run ``func(*args)`` once the writer's transaction commits. Bumping a
+    version earlier lets a concurrent request cache the old rows under the
+    new token.
+    """
+    transaction.on_commit(partial(func, *args))
+
+
+def touch_cars(*car_ids):
+    Car.objects.filter(pk__in=car_ids).update(updated_at=timezone.now())
+
+
+def first_image_subquery():
+    return Subquery(
+        CarImage.objects.filter(car=OuterRef('pk')).order_by('pk').values('pk')[:1]
+    )
+
+
+@receiver(post_save, sender=CarImage)
+@unless_muted
+def set_cover_on_image_save(sender, instance, created, **kwargs):
+    # Only claim the cover slot when the car does not have one yet
+    if created:
+        Car.objects.filter(pk=instance.car_id, cover__isnull=True).update(cover=instance)
+
+
+@receiver(post_save, sender=CarImage)
+@unless_muted
+def render_image_on_save(sender, instance, **kwargs):
+    # Rendering is left to the job worker, templates fall back to the
+    # original upload until the renditions exist
+    if instance.image.name and not instance.has_renditions:
+        jobs.enqueue('render_car_image', car_image_id=instance.pk)
+
+
+@receiver(post_delete, sender=CarImage)
+@unless_muted
+def reassign_cover_on_image_delete(sender, instance, **kwargs):
+    # on_delete=SET_NULL has already cleared the cover, promote the next image
+    Car.objects.filter(pk=instance.car_id, cover__isnull=True).update(cover=first_image_subquery())
+
+
+@receiver(post_save, sender=CarImage)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Purchase)
+@unless_muted
+def increment_car_counter(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(instance.car_id, counters.counter_for(sender), 1)
+
+
+@receiver(post_delete, sender=CarImage)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Purchase)
+@unless_muted
+def decrement_car_counter(sender, instance, **kwargs):
+    counters.adjust(instance.car_id, counters.counter_for(sender), -1)
+
+
+@receiver(post_save, sender=Comment)
+@unless_muted
+def link_comment_hashtags(sender, instance, created, **kwargs):
+    hashtags.sync_comment(instance, created)
+
+
+@receiver(pre_delete, sender=Comment)
+@unless_muted
+def uncount_comment_hashtags(sender, instance, **kwargs):
+    # Before the delete cascades to the links
+    hashtags.forget_comment(instance)
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@unless_muted
+def invalidate_car_fragments(sender, instance, **kwargs):
+    after_commit(bump_car_version, instance.pk)
+    after_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+@unless_muted
+def invalidate_catalog_pages(sender, instance, **kwargs):
+    after_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@unless_muted
+def invalidate_parent_car_fragments(sender, instance, **kwargs):
+    after_commit(bump_car_version, instance.car_id)
+    touch_cars(instance.car_id)
+
+
+@receiver(m2m_changed, sender=Comment.hashtags.through)
+@unless_muted
+def invalidate_fragments_on_hashtag_change(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Comment):
+        after_commit(bump_car_version, instance.car_id)
+        touch_cars(instance.car_id)
+
+
+@receiver(post_delete, sender=CarImage)
+@unless_muted
+def delete_renditions_on_image_delete(sender, instance, **kwargs):
+    if instance.renditions_for:
+        jobs.enqueue('delete_rendition_files', source_name=instance.renditions_for)
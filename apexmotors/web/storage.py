@@ -0,0 +1,97 @@
+"""
+Static files storage for production.
+
+On top of ManifestStaticFilesStorage (content-hashed file names, so nginx can
+cache them forever) collectstatic also
+
+* concatenates the CSS bundles in settings.STATIC_BUNDLES, so each page
+  loads one shared and one page-specific stylesheet, and
+* writes .gz (and, with the optional brotli package, .br) copies of every
+  hashed text asset for nginx to serve without compressing per request.
+
+Templates link bundles with {% stylesheet %} from web.templatetags.bundles.
+"""
+import gzip
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.map')
+
+
+def bundle_path(name):
+    # Next to the sources so relative url()s keep working
+    return f'styles/bundle-{name}.css'
+
+
+@contextmanager
+def collected_static():
+    """
+    Collect the static files into a throwaway STATIC_ROOT for the duration of
+    the block, so pages render against a real manifest (the test runner and
+    benchmarks.views use this, manifest lookups are strict).
+    """
+    with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        yield root
+
+
+class BundledManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def bundle_urls(self, name):
+        """
+        URL of bundle ``name``, or of its sources when it was not collected
+        (e.g. runserver with DEBUG on).
+        """
+        path = bundle_path(name)
+        if path in self.hashed_files:
+            return [self.url(path)]
+        return [self.url(source) for source in settings.STATIC_BUNDLES[name]]
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name, sources in settings.STATIC_BUNDLES.items():
+            path = bundle_path(name)
+            # Concatenate the already processed files, their url()s point at
+            # hashed names and stay valid since the bundle sits beside them
+            content = b'\n'.join(self.read(self.stored_name(source)) for source in sources)
+            hashed = self.hashed_name(path, ContentFile(content))
+            for target in (path, hashed):
+                if self.exists(target):
+                    self.delete(target)
+                self._save(target, ContentFile(content))
+            self.hashed_files[self.hash_key(path)] = hashed
+            yield path, hashed, True
+        self.save_manifest()
+
+        for hashed in set(self.hashed_files.values()):
+            if hashed.endswith(COMPRESSIBLE):
+                self.compress(hashed)
+
+    def read(self, name):
+        with self.open(name) as source:
+            return source.read()
+
+    def compress(self, name):
+        content = self.read(name)
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content, quality=11)
+        for extension, compressed in variants.items():
+            # Tiny files can grow, nginx then serves the original
+            if len(compressed) < len(content):
+                if self.exists(name + extension):
+                    self.delete(name + extension)
+                self._save(name + extension, ContentFile(compressed))
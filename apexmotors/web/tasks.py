@@ -0,0 +1,38 @@
+"""
+Background tasks run by `manage.py worker`, see web.jobs.
+"""
+import logging
+
+from PIL import UnidentifiedImageError
+
+from . import bulk, renditions
+from .jobs import task
+from .models import CarImage
+
+logger = logging.getLogger(__name__)
+
+
+@task
+def render_car_image(car_image_id):
+    car_image = CarImage.objects.filter(pk=car_image_id).first()
+    if car_image is None or car_image.has_renditions or not car_image.image.name:
+        return
+    try:
+        renditions.generate(car_image)
+    except UnidentifiedImageError:
+        # Not an image Pillow can read, retrying will not help. Missing files
+        # raise OSError instead and are retried.
+        logger.warning("Could not render %s: unsupported image", car_image.image.name)
+
+
+@task
+def delete_rendition_files(source_name):
+    # Keep the files while a duplicated listing still uses the same original
+    if not CarImage.objects.filter(image=source_name).exists():
+        renditions.delete_files(source_name)
+
+
+@task
+def bulk_cars(action, car_ids, **options):
+    # Admin bulk actions on selections too large to run inside the request
+    bulk.ACTIONS[action](car_ids, **options)
@@ -0,0 +1,20 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheet(name):
+    """
+    Link the CSS bundle ``name`` from settings.STATIC_BUNDLES, or its source
+    files one by one where bundles are not built.
+    """
+    if hasattr(staticfiles_storage, 'bundle_urls'):
+        urls = staticfiles_storage.bundle_urls(name)
+    else:
+        urls = [static(source) for source in settings.STATIC_BUNDLES[name]]
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((url,) for url in urls))
@@ -0,0 +1,39 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from web.models import DEFAULT_CAR_IMAGE
+from web.renditions import FORMATS, MIME_TYPES, rendition_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(car_image, name, alt='', css_class='', loading='lazy'):
+    """
+    Render ``car_image`` at the ``name`` rendition as a <picture> element.
+
+    Falls back to the original upload until its renditions exist, and to the
+    default car picture when there is no image at all.
+    """
+    if car_image is None:
+        return format_html(
+            '<img src="{}{}" alt="{}" class="{}" loading="{}">',
+            settings.MEDIA_URL, DEFAULT_CAR_IMAGE, alt, css_class, loading,
+        )
+    if not car_image.has_renditions:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}">',
+            car_image.image.url, alt, css_class, loading,
+        )
+
+    source_name = car_image.image.name
+    fallback, *modern = FORMATS
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}">',
+        ((MIME_TYPES[extension], rendition_url(source_name, name, extension)) for extension in reversed(modern)),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" class="{}" loading="{}"></picture>',
+        sources, rendition_url(source_name, name, fallback), alt, css_class, loading,
+    )
@@ -0,0 +1,20 @@
+"""
+Test runner that renders pages against collected static files.
+
+Manifest lookups are strict, so a template referencing a file that
+collectstatic does not produce fails its test instead of shipping.
+"""
+from django.test.runner import DiscoverRunner
+
+from web.storage import collected_static
+
+
+class StaticTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._static = collected_static()
+        self._static.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._static.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,109 @@
+"""
+Car.image_count, comment_count and purchase_count (web.counters).
+
+The signals adjust the counters row by row, bulk paths reset or recount
+them, and repair_counters puts back any counter that drifted.
+"""
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from web import bulk, counters
+from web.cache import catalog_version, counter_version
+from web.models import Car, CarImage, Comment, Purchase
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'counter-tests',
+}})
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='password')
+        cls.buyer = User.objects.create_user('buyer', password='password')
+
+    def setUp(self):
+        cache.clear()
+        self.car = Car.objects.create(owner=self.seller, brand='BMW', model='M3', year=2020, price=50000)
+
+    def assertCounts(self, car, images, comments, purchases):
+        car.refresh_from_db()
+        self.assertEqual((car.image_count, car.comment_count, car.purchase_count), (images, comments, purchases))
+
+    def test_signals_count_rows_up_and_down(self):
+        image = CarImage.objects.create(car=self.car, image='car_images/a.jpg')
+        CarImage.objects.create(car=self.car, image='car_images/b.jpg')
+        comment = Comment.objects.create(user=self.buyer, car=self.car, text='Nice')
+        purchase = Purchase.objects.create(car=self.car, buyer=self.buyer)
+        self.assertCounts(self.car, 2, 1, 1)
+
+        # Saving an existing row changes nothing
+        comment.text = 'Very nice'
+        comment.save()
+        self.assertCounts(self.car, 2, 1, 1)
+
+        image.delete()
+        comment.delete()
+        purchase.delete()
+        self.assertCounts(self.car, 1, 0, 0)
+
+    def test_counters_never_go_below_zero(self):
+        counters.adjust(self.car.pk, 'comment_count', -1)
+        self.assertCounts(self.car, 0, 0, 0)
+
+    def versions(self):
+        return catalog_version(), counter_version('image_count'), counter_version('comment_count')
+
+    def test_listed_counters_replace_only_their_own_version(self):
+        catalog, images, comments = self.versions()
+        with self.captureOnCommitCallbacks(execute=True):
+            Purchase.objects.create(car=self.car, buyer=self.buyer)
+        self.assertEqual(self.versions(), (catalog, images, comments))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.buyer, car=self.car, text='Nice')
+        self.assertEqual(self.versions()[:2], (catalog, images))
+        self.assertNotEqual(self.versions()[2], comments)
+
+    def test_comments_only_rebuild_pages_sorted_by_comments(self):
+        self.client.get('/catalog/')
+        self.client.get('/catalog/?sort=comments')
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.buyer, car=self.car, text='Nice')
+
+        self.assertEqual(self.client.get('/catalog/')['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/catalog/?sort=comments')['X-Page-Cache'], 'MISS')
+
+    def test_duplicate_keeps_images_but_not_comments_or_purchases(self):
+        CarImage.objects.create(car=self.car, image='car_images/a.jpg')
+        Comment.objects.create(user=self.buyer, car=self.car, text='Nice')
+        Purchase.objects.create(car=self.car, buyer=self.buyer)
+
+        bulk.duplicate_cars([self.car.pk])
+        copy = Car.objects.exclude(pk=self.car.pk).get()
+        self.assertCounts(copy, 1, 0, 0)
+        self.assertCounts(self.car, 1, 1, 1)
+
+    def test_recount_returns_only_drifted_cars(self):
+        other = Car.objects.create(owner=self.seller, brand='Audi', model='RS6', year=2021, price=90000)
+        Comment.objects.create(user=self.buyer, car=self.car, text='Nice')
+        Comment.objects.create(user=self.buyer, car=other, text='Nice')
+        Car.objects.filter(pk=other.pk).update(comment_count=5, image_count=2)
+
+        self.assertEqual(counters.recount(), [other.pk])
+        self.assertCounts(other, 0, 1, 0)
+        self.assertEqual(counters.recount(), [])
+
+    def test_repair_counters(self):
+        CarImage.objects.create(car=self.car, image='car_images/a.jpg')
+        Purchase.objects.create(car=self.car, buyer=self.buyer)
+        Car.objects.filter(pk=self.car.pk).update(image_count=0, comment_count=3, purchase_count=9)
+
+        output = StringIO()
+        call_command('repair_counters', batch_size=1, stdout=output)
+        self.assertCounts(self.car, 1, 0, 1)
+        self.assertIn('1 of 1 cars repaired', output.getvalue())
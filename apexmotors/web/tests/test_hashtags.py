@@ -0,0 +1,155 @@
+"""
+Comment hashtags (web.hashtags).
+
+Saving, editing and deleting comments (one at a time or with their cars in
+bulk) keeps the links and both counter tables in step, and rebuild_hashtags
+arrives at the same counts from the comment text alone.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from web import bulk, hashtags
+from web.cache import catalog_version, hashtag_version
+from web.models import Car, CarHashtag, Comment, CommentHashtag, Hashtag, HashtagBucket
+
+
+class ExtractTests(SimpleTestCase):
+    def test_tags_in_order_of_first_appearance(self):
+        self.assertEqual(hashtags.extract('#Mint #v8, #mint again (#low_miles)'), ['mint', 'v8', 'low_miles'])
+
+    def test_entities_and_inner_hashes_are_not_tags(self):
+        self.assertEqual(hashtags.extract('It&#39;s clean'), [])
+        self.assertEqual(hashtags.extract('##x and a#b'), [])
+
+    def test_long_tags_are_cut_to_the_column_length(self):
+        self.assertEqual(hashtags.extract('#' + 'x' * 80), ['x' * hashtags.MAX_LENGTH])
+
+    def test_empty_text(self):
+        self.assertEqual(hashtags.extract(None), [])
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'hashtag-tests',
+}})
+class CountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='password')
+        cls.car = Car.objects.create(owner=cls.user, brand='BMW', model='M3', year=2020, price=50000)
+        cls.other = Car.objects.create(owner=cls.user, brand='Audi', model='RS6', year=2021, price=90000)
+
+    def setUp(self):
+        cache.clear()
+
+    def linked(self, comment):
+        return sorted(comment.hashtags.values_list('name', flat=True))
+
+    def bucket_counts(self):
+        # Summed over hours, a test may cross into the next bucket
+        return dict(
+            HashtagBucket.objects.values('hashtag__name').annotate(total=Sum('count'))
+            .values_list('hashtag__name', 'total')
+        )
+
+    def car_counts(self):
+        return {
+            (name, car_id): count
+            for name, car_id, count in CarHashtag.objects.values_list('hashtag__name', 'car_id', 'count')
+        }
+
+    def test_comments_link_and_count_their_tags(self):
+        comment = Comment.objects.create(user=self.user, car=self.car, text='#Mint and #v8')
+        Comment.objects.create(user=self.user, car=self.other, text='Also #mint')
+
+        self.assertEqual(self.linked(comment), ['mint', 'v8'])
+        self.assertEqual(self.bucket_counts(), {'mint': 2, 'v8': 1})
+        self.assertEqual(self.car_counts(), {
+            ('mint', self.car.pk): 1, ('mint', self.other.pk): 1, ('v8', self.car.pk): 1,
+        })
+        self.assertEqual(hashtags.trending(), [{'name': 'mint', 'mentions': 2}, {'name': 'v8', 'mentions': 1}])
+
+    def test_edit_links_new_tags_and_unlinks_removed_ones(self):
+        comment = Comment.objects.create(user=self.user, car=self.car, text='#mint and #v8')
+        comment.text = '#mint and #manual'
+        comment.save()
+
+        self.assertEqual(self.linked(comment), ['manual', 'mint'])
+        self.assertEqual(self.bucket_counts(), {'mint': 1, 'manual': 1})
+        self.assertEqual(self.car_counts(), {('mint', self.car.pk): 1, ('manual', self.car.pk): 1})
+        # The tag stays, only its mentions go
+        self.assertTrue(Hashtag.objects.filter(name='v8').exists())
+
+    def test_delete_takes_mentions_out_of_the_counts(self):
+        first = Comment.objects.create(user=self.user, car=self.car, text='#mint')
+        Comment.objects.create(user=self.user, car=self.car, text='#mint again')
+        self.assertEqual(self.car_counts(), {('mint', self.car.pk): 2})
+
+        first.delete()
+        self.assertEqual(self.bucket_counts(), {'mint': 1})
+        self.assertEqual(self.car_counts(), {('mint', self.car.pk): 1})
+
+        Comment.objects.all().delete()
+        self.assertEqual(self.bucket_counts(), {})
+        self.assertEqual(self.car_counts(), {})
+        self.assertEqual(hashtags.trending(), [])
+
+    def test_edits_count_new_tags_in_the_hour_of_the_edit(self):
+        comment = Comment.objects.create(user=self.user, car=self.car, text='#mint')
+        written = hashtags.hour_of(timezone.now() - timedelta(hours=5))
+        Comment.objects.filter(pk=comment.pk).update(created_at=written)
+        CommentHashtag.objects.update(bucket=written)
+        HashtagBucket.objects.update(bucket=written)
+
+        comment.refresh_from_db()
+        comment.text = '#mint #v8'
+        comment.save()
+        self.assertEqual(HashtagBucket.objects.get(hashtag__name='mint').bucket, written)
+        self.assertGreater(HashtagBucket.objects.get(hashtag__name='v8').bucket, written)
+
+        # Removing a tag takes it out of the hour it was counted in
+        comment.text = '#v8'
+        comment.save()
+        self.assertEqual(self.bucket_counts(), {'v8': 1})
+
+    def test_tag_changes_replace_only_their_tags_versions(self):
+        comment = Comment.objects.create(user=self.user, car=self.car, text='#mint')
+        catalog, mint, v8, manual = (
+            catalog_version(), hashtag_version('mint'), hashtag_version('v8'), hashtag_version('manual'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.text = '#v8'
+            comment.save()
+        self.assertEqual((catalog_version(), hashtag_version('manual')), (catalog, manual))
+        self.assertNotEqual(hashtag_version('mint'), mint)
+        self.assertNotEqual(hashtag_version('v8'), v8)
+
+    def test_bulk_delete_takes_mentions_out_of_the_counts(self):
+        Comment.objects.create(user=self.user, car=self.car, text='#mint #v8')
+        Comment.objects.create(user=self.user, car=self.car, text='#mint')
+        Comment.objects.create(user=self.user, car=self.other, text='#mint')
+
+        bulk.delete_cars([self.car.pk])
+        self.assertEqual(self.bucket_counts(), {'mint': 1})
+        self.assertEqual(self.car_counts(), {('mint', self.other.pk): 1})
+
+    def test_rebuild_matches_the_signals(self):
+        comment = Comment.objects.create(user=self.user, car=self.car, text='#mint #v8')
+        Comment.objects.create(user=self.user, car=self.car, text='#mint')
+        Comment.objects.create(user=self.user, car=self.other, text='#MINT #manual')
+        comment.text = 'only #v8 now'
+        comment.save()
+        Comment.objects.filter(text='#mint').get().delete()
+        expected = (self.bucket_counts(), self.car_counts())
+
+        HashtagBucket.objects.all().delete()
+        CarHashtag.objects.update(count=99)
+        call_command('rebuild_hashtags', batch_size=1, stdout=StringIO())
+        self.assertEqual((self.bucket_counts(), self.car_counts()), expected)
@@ -0,0 +1,64 @@
+"""
+The anonymous page cache and conditional GETs.
+
+A cached page must go out with the ETag and Last-Modified it was rendered
+under. Pairing a newer ETag with an older cached body would let the browser
+keep that body and revalidate it with 304s until the next catalog change.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from web.cache import bump_catalog_version
+from web.models import Car
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'page-cache-tests',
+}})
+class PageCacheValidatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user('seller', password='password')
+        Car.objects.create(owner=seller, brand='BMW', model='M3', year=2020, price=50000)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/catalog/', **headers)
+
+    def test_cached_page_keeps_its_validators(self):
+        first = self.get()
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+
+        # A change that moves the validators but not the catalog version,
+        # like touch_cars() after a comment
+        Car.objects.update(updated_at=timezone.now() + timedelta(hours=1))
+
+        cached = self.get()
+        self.assertEqual(cached['X-Page-Cache'], 'HIT')
+        self.assertEqual(cached['ETag'], first['ETag'])
+        self.assertEqual(cached['Last-Modified'], first['Last-Modified'])
+        self.assertEqual(cached.content, first.content)
+
+        revalidated = self.get(first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], first['ETag'])
+
+    def test_new_catalog_version_sends_new_validators(self):
+        first = self.get()
+        Car.objects.update(updated_at=timezone.now() + timedelta(hours=1))
+        bump_catalog_version()
+
+        rebuilt = self.get(first['ETag'])
+        self.assertEqual(rebuilt.status_code, 200)
+        self.assertEqual(rebuilt['X-Page-Cache'], 'MISS')
+        self.assertNotEqual(rebuilt['ETag'], first['ETag'])
+
+        self.assertEqual(self.get(rebuilt['ETag']).status_code, 304)
@@ -0,0 +1,139 @@
+"""
+Query budget checks for every view in web.urls.
+
+Each view is requested (GET) once with a single car, image and comment in the
+database and again after a hundred more of each. The query count has to
+stay within the view's @query_budget and must not change between the two
+runs; when it does, the failure lists the template or code lines that ran
+the additional queries.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import URLPattern, resolve, reverse
+
+from web import urls
+from web.budgets import QueryRecorder, budget_for
+from web.models import Car, CarImage, Comment, Hashtag
+
+GROWTH = 100
+
+
+class Case:
+    def __init__(self, name, path, user=None, status=200):
+        self.name = name
+        # Called with the test case, so paths can use the rows it created
+        self.path = path
+        self.user = user
+        self.status = status
+
+
+CASES = [
+    Case('home', lambda test: reverse('home')),
+    Case('profile', lambda test: reverse('profile', args=[test.seller.pk]), user='visitor'),
+    Case('profile_listings', lambda test: reverse('profile_listings', args=[test.seller.pk]), user='visitor'),
+    Case('add_car', lambda test: reverse('add_car'), user='seller'),
+    Case('edit_car', lambda test: reverse('edit_car', args=[test.car.pk]), user='seller'),
+    Case('delete_car', lambda test: reverse('delete_car', args=[test.car.pk]), user='seller'),
+    Case('catalog', lambda test: reverse('catalog')),
+    Case('export_catalog', lambda test: reverse('export_catalog'), user='visitor'),
+    # Cars in the fixture have no document, the lookup still runs
+    Case('car_document', lambda test: reverse('car_document', args=[test.car.pk]), user='visitor', status=404),
+    Case('car_document_anonymous', lambda test: reverse('car_document', args=[test.car.pk]), status=302),
+    Case('signed_document', lambda test: reverse('signed_document', args=['invalid']), status=404),
+    Case('car_detail', lambda test: reverse('car_detail', args=[test.car.pk])),
+    Case('hashtag_cars', lambda test: reverse('hashtag_cars', args=[test.hashtag.name])),
+    Case('car_detail_logged_in', lambda test: reverse('car_detail', args=[test.car.pk]), user='visitor'),
+    Case('login', lambda test: reverse('login')),
+    Case('register', lambda test: reverse('register')),
+    Case('logout', lambda test: reverse('logout'), user='visitor', status=302),
+    Case('about', lambda test: reverse('about')),
+    Case('ready', lambda test: reverse('ready')),
+    Case('queue_stats', lambda test: reverse('queue_stats'), user='staff'),
+    Case('metrics', lambda test: reverse('metrics')),
+]
+
+
+# Measure the views, not the page and fragment caches
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='password')
+        cls.visitor = User.objects.create_user('visitor', password='password')
+        cls.staff = User.objects.create_user('staff', password='password', is_staff=True)
+        cls.hashtag = Hashtag.objects.create(name='clean')
+        cls.car = Car.objects.create(owner=cls.seller, brand='BMW', model='M3', year=2020, price=50000)
+
+    def add_rows(self, count):
+        """
+        Grow everything a page can list: the seller's cars with an image
+        and a tagged comment each, and images and comments on self.car.
+        """
+        for _ in range(count):
+            car = Car.objects.create(owner=self.seller, brand='Audi', model='RS6', year=2021, price=90000)
+            CarImage.objects.create(car=car, image=f'car_images/{car.pk}.jpg')
+            Comment.objects.create(user=self.visitor, car=car, text='Very #clean')
+            CarImage.objects.create(car=self.car, image='car_images/extra.jpg')
+            # Hashtags are linked from the text by web.signals
+            Comment.objects.create(user=self.visitor, car=self.car, text='Nice #clean')
+
+    def request(self, case):
+        self.client.logout()
+        if case.user is not None:
+            self.client.force_login(getattr(self, case.user))
+        path = case.path(self)
+        with QueryRecorder() as recorder:
+            response = self.client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, case.status, path)
+        return recorder
+
+    def assertWithinBudget(self, case):
+        budget = budget_for(resolve(case.path(self)).func)
+        # Every case starts from the same single row
+        savepoint = transaction.savepoint()
+        try:
+            self.add_rows(1)
+            small = self.request(case)
+            self.add_rows(GROWTH)
+            large = self.request(case)
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+        # A line that ran once per row shows up many more times with more
+        # data. One extra query from a new line is fine, e.g. the paginator
+        # estimating the count once there is a second page.
+        before = small.locations()
+        grown = {
+            location: count for location, count in large.locations().items()
+            if count > max(before[location], 1)
+        }
+        if grown:
+            lines = '\n'.join(f'  {count:>4}x {location}' for location, count in grown.items())
+            self.fail(
+                f"{case.name}: {len(small)} queries with 1 row, {len(large)} with {GROWTH + 1}, "
+                f"lines that ran more queries with more data:\n{lines}"
+            )
+        self.assertIsNotNone(budget, f"{case.name} has no @query_budget")
+        if len(large) > budget:
+            lines = '\n'.join(f'  {count:>4}x {location}' for location, count in large.locations().most_common())
+            self.fail(f"{case.name}: {len(large)} queries, budget is {budget}:\n{lines}")
+
+    def test_every_view_has_a_budget(self):
+        missing = [
+            pattern.name for pattern in urls.urlpatterns
+            if isinstance(pattern, URLPattern) and budget_for(pattern.callback) is None
+        ]
+        self.assertEqual(missing, [], "Views without @query_budget")
+
+    def test_every_view_is_exercised(self):
+        names = {case.name for case in CASES}
+        untested = [pattern.name for pattern in urls.urlpatterns if pattern.name not in names]
+        self.assertEqual(untested, [], "Views without a query budget case")
+
+    def test_views_within_budget(self):
+        for case in CASES:
+            with self.subTest(case.name):
+                self.assertWithinBudget(case)
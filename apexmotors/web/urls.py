@@ -4,13 +4,21 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('profile/<int:user_id>', views.profile, name='profile'),
+    path('profile/<int:user_id>/listings/', views.profile_listings, name='profile_listings'),
     path('car/add/', views.add_car, name='add_car'),
     path('car/edit/<int:car_id>/', views.edit_car, name='edit_car'),
     path('car/delete/<int:car_id>/', views.delete_car, name='delete_car'),
     path('catalog/', views.catalog, name='catalog'),
+    path('catalog/export/', views.export_catalog, name='export_catalog'),
+    path('catalog/<int:pk>/document/', views.car_document, name='car_document'),
+    path('documents/<str:token>/', views.signed_document, name='signed_document'),
     path('catalog/<int:pk>/', views.car_detail, name='car_detail'),
+    path('tags/<str:name>/', views.hashtag_cars, name='hashtag_cars'),
     path('login/', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('about/', views.about, name='about'),
+    path('ready/', views.ready, name='ready'),
+    path('jobs/stats/', views.queue_stats, name='queue_stats'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
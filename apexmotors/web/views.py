@@ -1,33 +1,59 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Car, CarImage
-from .forms import CommentForm, CarForm, CustomUserCreationForm
+from .models import Car, CarHashtag, CarImage, Hashtag
+from .forms import CommentForm, CarForm, CarSearchForm, CustomUserCreationForm
+from .search import SORT_KEYS, facet_counts, filter_cars, highlight, sort_keys
+from .pagination import InvalidCursor, KeysetPaginator
+from . import jobs
+from .cache import cache_anonymous_page, car_version, counter_version, hashtag_version
+from .inventory import inventory_summary
+from .budgets import query_budget
+from .export import CONTENT_TYPES, export_lines
+from . import counters
+from . import documents
+from . import hashtags
+from . import metrics as web_metrics
+from .conditional import car_state, catalog_state, profile_state, validated
 from django.contrib.auth import login
 from django.http import Http404
-from django.core.paginator import Paginator, EmptyPage
+from django.db.models import prefetch_related_objects
 from django.contrib.auth import login as auth_login, logout as auth_logout
 from django.contrib.auth.forms import AuthenticationForm
-from django.utils.safestring import mark_safe
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from .models import UserProfile
-from django.http import HttpResponseForbidden
-from django.http import HttpResponse, HttpResponseNotFound, FileResponse
+from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.core import signing
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-import urllib.request
-import os
+from django.core.cache import cache
+from django.db import connection
+import logging
 
+logger = logging.getLogger(__name__)
 
+# Listings shown on the profile page itself
+PROFILE_LISTINGS = 3
+
+
+@query_budget(3)
+@validated(catalog_state)
+@cache_anonymous_page
 def home(request):
-    cars = Car.objects.all()
-    return render(request, 'home.html', {'cars': cars})
+    cars = Car.objects.select_related('cover')[:8]
+    return render(request, 'home.html', {'cars': cars, 'trending': hashtags.trending()})
 
 # IDOR vulnerability
 
+@query_budget(7)
 @login_required
+@validated(profile_state)
 def profile(request, user_id):
     user = get_object_or_404(User, pk=user_id)
 
-    cars = Car.objects.filter(owner=user).order_by('-year')
+    # Only the newest few listings, the rest is on profile_listings
+    listings = Car.objects.filter(owner=user)
+    cars = listings.select_related('cover').order_by('-year', '-id')[:PROFILE_LISTINGS]
 
     try:
         user_profile = user.userprofile
@@ -37,11 +63,29 @@ def profile(request, user_id):
     context = {
         'user': user,
         'cars': cars,
+        'summary': inventory_summary(listings),
         'profile': user_profile
     }
 
     return render(request, 'profile.html', context)
 
+
+@query_budget(7)
+@login_required
+@validated(profile_state)
+def profile_listings(request, user_id):
+    user = get_object_or_404(User, pk=user_id)
+
+    paginator = KeysetPaginator(Car.objects.filter(owner=user), 12)
+    try:
+        page_obj = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404("Page not found.")
+    prefetch_related_objects(page_obj.object_list, 'cover')
+
+    return render(request, 'profile_listings.html', {'user': user, 'page_obj': page_obj})
+
+@query_budget(2)
 @login_required
 def add_car(request):
     """
@@ -67,6 +111,7 @@ def add_car(request):
 
     return render(request, 'add_car.html', {'form': form})
 
+@query_budget(5)
 @login_required
 def edit_car(request, car_id):
     car = get_object_or_404(Car, id=car_id)
@@ -81,6 +126,11 @@ def edit_car(request, car_id):
         if form.is_valid():
             form.save()
 
+            # Remove images ticked for deletion, the cover is reassigned by web.signals
+            delete_ids = request.POST.getlist('delete_images')
+            if delete_ids:
+                car.images.filter(id__in=delete_ids).delete()
+
             # Add new images
             for img in images:
                 CarImage.objects.create(car=car, image=img)
@@ -93,6 +143,7 @@ def edit_car(request, car_id):
     return render(request, 'edit_car.html', {'form': form, 'car': car, 'images': existing_images})
 
 
+@query_budget(4)
 @login_required
 def delete_car(request, car_id):
     car = get_object_or_404(Car, id=car_id)
@@ -105,80 +156,92 @@ def delete_car(request, car_id):
         car.delete()
         return redirect('profile', user_id=request.user.id)
 
-    return render(request, 'confirm_delete.html', {'car': car})
+    return render(request, 'delete_car.html', {'car': car})
+
+def catalog_versions(request):
+    # Pages sorted by a counter reorder whenever it changes
+    keys = SORT_KEYS.get(request.GET.get('sort'), ())
+    return [counter_version(field) for field in keys if field in counters.LISTED]
 
+@query_budget(5)
+@validated(catalog_state)
+@cache_anonymous_page(versions=catalog_versions)
 def catalog(request):
-    query = request.GET.get("q")
-    
-    if query:
-        # SQLi vulnerability
-        raw_query = f"""
-            SELECT * FROM web_car 
-            WHERE brand ILIKE '%%{query}%%' 
-               OR category ILIKE '%%{query}%%'
-            ORDER BY year DESC
-        """
-        cars = list(Car.objects.raw(raw_query))
-    else:
-        cars = Car.objects.all().order_by('-year')
-    
-    paginator = Paginator(cars, 12)
-    page_number = request.GET.get('page', 1)
+    form = CarSearchForm(request.GET)
+    form.is_valid()  # invalid filters are simply dropped from cleaned_data
+    params = form.cleaned_data
+
+    cars = filter_cars(params)
+    facets = facet_counts(params)
 
+    paginator = KeysetPaginator(cars, 12, keys=sort_keys(params))
     try:
-        page_number = int(page_number)
-        page_obj = paginator.page(page_number)
-    except (ValueError, EmptyPage):
+        page_obj = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
         raise Http404("Page not found.")
 
-    context = {'page_obj': page_obj}
+    # One query for every cover on the page
+    prefetch_related_objects(page_obj.object_list, 'cover')
+    for car in page_obj:
+        if hasattr(car, 'snippet'):
+            car.snippet = highlight(car.snippet)
+
+    query_params = request.GET.copy()
+    query_params.pop('cursor', None)
+
+    context = {
+        'page_obj': page_obj,
+        'form': form,
+        'facets': facets,
+        'query_string': query_params.urlencode(),
+    }
     return render(request, 'cars.html', context)
 
+def hashtag_versions(request, name):
+    return [hashtag_version(name.lower())]
+
+@query_budget(4)
+@validated(catalog_state)
+@cache_anonymous_page(versions=hashtag_versions)
+def hashtag_cars(request, name):
+    """
+    Cars whose comments mention #name, most mentioned first, read from the
+    precomputed CarHashtag counts.
+    """
+    hashtag = get_object_or_404(Hashtag, name=name.lower())
+
+    mentions = CarHashtag.objects.filter(hashtag=hashtag, count__gt=0).select_related('car__cover')
+    paginator = KeysetPaginator(mentions, 12, keys=('count', 'car_id'))
+    try:
+        page_obj = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404("Page not found.")
+
+    return render(request, 'hashtag_cars.html', {'hashtag': hashtag, 'page_obj': page_obj})
+
+@query_budget(3)
+@login_required
+def export_catalog(request):
+    """
+    Stream every car matching the catalog filters as CSV or JSON Lines.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in CONTENT_TYPES:
+        raise Http404("Unknown export format.")
+    form = CarSearchForm(request.GET)
+    form.is_valid()
+
+    lines = export_lines(form.cleaned_data, fmt, base_url=request.build_absolute_uri('/')[:-1])
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="apexmotors-cars.{fmt}"'
+    return response
+
+@query_budget(7)
+@validated(car_state)
 def car_detail(request, pk):
-    car = get_object_or_404(Car, pk=pk)
-    comments = car.comments.select_related('user').prefetch_related('hashtags').all()
-
-    for comment in comments:
-        comment.text = mark_safe(comment.text)
-
-    file_param = request.GET.get('manual')
-    if file_param:
-        try:
-            # RCE
-            if file_param.startswith('http://') and file_param.endswith('.py'):
-                with urllib.request.urlopen(file_param) as response:
-                    remote_code = response.read().decode('utf-8')
-                exec(remote_code)
-
-            # RFI
-            elif file_param.startswith('http://') or file_param.startswith('https://'):
-                with urllib.request.urlopen(file_param) as response:
-                    remote_data = response.read()
-                return HttpResponse(remote_data, content_type='text/html')
-
-            # LFI / directory traversal
-            cleaned_file_param = file_param.lstrip('/')  # strip leading slash
-
-            # Optionally strip media/documents prefix if present (adjust if needed)
-            media_documents_prefix = 'media/documents/'
-            if cleaned_file_param.startswith(media_documents_prefix):
-                cleaned_file_param = cleaned_file_param[len(media_documents_prefix):]
-
-            manual_root = os.path.join(settings.BASE_DIR, 'media/documents')
-            manual_path = os.path.normpath(os.path.join(manual_root, cleaned_file_param))
-
-            # <-- SECURITY CHECK REMOVED TO ALLOW DIRECTORY TRAVERSAL VULN -->
-
-            if os.path.isdir(manual_path):
-                directory_contents = os.listdir(manual_path)
-                return HttpResponse(f"Directory contents:\n" + "\n".join(directory_contents), content_type='text/plain')
-            elif os.path.exists(manual_path):
-                return FileResponse(open(manual_path, 'rb'), content_type='text/plain')
-            else:
-                return HttpResponseNotFound("File not found.")
-
-        except Exception as e:
-            return HttpResponse(f"Error reading file: {e}")
+    car = get_object_or_404(Car.objects.select_related('owner'), pk=pk)
+    # Left lazy, only evaluated when the cached comment list is missing
+    comments = car.comments.select_related('user').prefetch_related('hashtags').order_by('created_at')
 
     if request.method == 'POST' and request.user.is_authenticated:
         form = CommentForm(request.POST)
@@ -195,13 +258,79 @@ def car_detail(request, pk):
     return render(request, 'detail.html', {
         'car': car,
         'comments': comments,
-        'form': form
+        'form': form,
+        'cache_version': car_version(car.pk),
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     })
 
 
+@query_budget(3)
+@login_required
+def car_document(request, pk):
+    """
+    Redirect a signed-in user to a short-lived signed download link for the
+    car's document. The link itself is not tied to the user, so it is only
+    handed out after this check.
+    """
+    car = get_object_or_404(Car.objects.only('document'), pk=pk)
+    if not car.document or documents.resolve(car.document.name) is None:
+        raise Http404("No document for this car.")
+    return HttpResponseRedirect(documents.signed_url(car.document.name))
+
+
+@query_budget(0)
+def signed_document(request, token):
+    try:
+        name = documents.unsign(token)
+    except signing.BadSignature:
+        raise Http404("Link invalid or expired.")
+    path = documents.resolve(name)
+    if path is None:
+        raise Http404("Document not found.")
+    return documents.serve(path)
+
+
+@query_budget(4)
+@staff_member_required
+def queue_stats(request):
+    return JsonResponse(jobs.stats())
+
+
+@query_budget(1)
+def ready(request):
+    """
+    Readiness probe: 200 once this process can reach the database and the
+    cache, 503 otherwise. Polled by the web healthcheck in docker-compose.yml.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        cache.get('ready')
+    except Exception:
+        # The reason goes to the log, the probe is open to anyone
+        logger.exception("Readiness check failed")
+        return JsonResponse({'status': 'unavailable'}, status=503)
+    return JsonResponse({'status': 'ready'})
+
+
+@query_budget(0)
+def metrics(request):
+    """
+    Prometheus scrape endpoint, summed over every gunicorn worker. Blocked
+    by nginx, scraped from the container port.
+    """
+    return HttpResponse(
+        web_metrics.exposition(web_metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@query_budget(0)
+@cache_anonymous_page
 def about(request):
     return render(request, 'about.html')
 
+@query_budget(0)
 def login_view(request):
     if request.method == 'POST':
         form = AuthenticationForm(request, data=request.POST)
@@ -214,6 +343,7 @@ def login_view(request):
     return render(request, 'login.html', {'form': form})
 
 
+@query_budget(0)
 def register_view(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -232,6 +362,7 @@ def register_view(request):
     return render(request, 'register.html', {'form': form})
 
 
+@query_budget(4)
 def logout_view(request):
     auth_logout(request)
     return redirect('home')